@@ -0,0 +1,102 @@
+"""Helpers shared by the benchmarks."""
+import importlib.util
+import os
+import sys
+import types
+
+PACKAGE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'custom_components', 'cync_lights')
+
+def load_module(name):
+    """Load a module of the integration without running its __init__, so Home Assistant does not need to be installed"""
+    if 'cync_lights' not in sys.modules:
+        package = types.ModuleType('cync_lights')
+        package.__path__ = [PACKAGE_DIR]
+        sys.modules['cync_lights'] = package
+    module_name = f'cync_lights.{name}'
+    if module_name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(module_name, os.path.join(PACKAGE_DIR, f'{name}.py'))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        spec.loader.exec_module(module)
+    return sys.modules[module_name]
+
+def synthetic_config(homes=1, devices_per_home=250, devices_per_controller=4, devices_per_room=10, multi_element_every=0, subgroups_per_room=0):
+    """
+    Build a cync_config with the given number of homes and devices, every devices_per_controller-th device is a Wi-Fi controller.
+    With subgroups_per_room, the devices of each room are shared between the room and that many subgroups nested in it.
+    """
+    home_devices = {}
+    home_controllers = {}
+    switchID_to_homeID = {}
+    devices = {}
+    rooms = {}
+    for home in range(homes):
+        home_id = str(1000 + home)
+        home_devices[home_id] = {}
+        home_controllers[home_id] = []
+        room_count = (devices_per_home - 1)//devices_per_room + 1
+        room_names = {}
+        for index in range(1, devices_per_home + 1):
+            device_id = f'{home_id}{index:04d}'
+            room = (index - 1)//devices_per_room + 1
+            part = ((index - 1) % devices_per_room)*(subgroups_per_room + 1)//devices_per_room
+            if part > 0:
+                #subgroups are numbered after the rooms
+                room_names.setdefault(room_count + (room - 1)*subgroups_per_room + part, f'Room {room} part {part}')
+                room = room_count + (room - 1)*subgroups_per_room + part
+            room_names.setdefault(room, f'Room {room}')
+            room_id = f'{home_id}-{room}'
+            home_devices[home_id][str(index)] = device_id
+            switch_id = str(100000 + home*1000 + index) if index % devices_per_controller == 1 else '0'
+            devices[device_id] = {'name':f'Device {index}', 'mesh_id':index, 'switch_id':switch_id, 'ONOFF':True, 'BRIGHTNESS':True, 'COLORTEMP':True, 'RGB':index % 2 == 0, 'MOTION':False, 'AMBIENT_LIGHT':False, 'WIFICONTROL':switch_id != '0', 'PLUG':False, 'FAN':False, 'home_name':f'Home {home}', 'room':room_id, 'room_name':room_names[room]}
+            if switch_id != '0':
+                switchID_to_homeID[switch_id] = home_id
+                home_controllers[home_id].append(int(switch_id))
+                devices[device_id]['switch_controller'] = int(switch_id)
+            if multi_element_every and index % multi_element_every == 0:
+                #two element switch, the second element sits 256 places after the first
+                devices[device_id]['MULTIELEMENT'] = 2
+                for element in range(2):
+                    element_id = f'{device_id}e{element}'
+                    home_devices[home_id][str((element+1)*256 + index)] = element_id
+                    devices[element_id] = dict(devices[device_id], name=f'Device {index} element {element}', mesh_id=(element+1)*256 + index, switch_id='0')
+                    del devices[element_id]['MULTIELEMENT']
+        for room in sorted(room_names):
+            room_id = f'{home_id}-{room}'
+            rooms[room_id] = {'name':room_names[room], 'mesh_id':room, 'room_controller':home_controllers[home_id][0], 'home_name':f'Home {home}', 'switches':[device_id for device_id, device in devices.items() if device['room'] == room_id and 'e' not in device_id[len(home_id):]], 'isSubgroup':room > room_count, 'subgroups':[]}
+            if room > room_count:
+                parent_id = f'{home_id}-{(room - room_count - 1)//subgroups_per_room + 1}'
+                rooms[parent_id]['subgroups'].append(room_id)
+                rooms[room_id]['parent_room'] = rooms[parent_id]['name']
+    return {'rooms':rooms, 'devices':devices, 'home_devices':home_devices, 'home_controllers':home_controllers, 'switchID_to_homeID':switchID_to_homeID}
+
+def synthetic_hub(cync_hub, cync_config, **options):
+    base_options = {'switches':[], 'rooms':[], 'subgroups':[], 'motion_sensors':[], 'ambient_light_sensors':[]}
+    base_options.update(options)
+    return cync_hub.CyncHub({'cync_credentials':[0], 'cync_config':cync_hub.compact_cync_config(cync_config)}, base_options, lambda: None)
+
+def state_dump(controller, records, brightness=50):
+    """Build the payload of a 0x73 0x52 state dump with one 24 byte record per mesh index in records"""
+    body = int(controller).to_bytes(4, 'big') + bytes.fromhex('0001007e00000000f852') + bytes(8)
+    for index in records:
+        record = bytearray(24)
+        record[0] = index
+        record[8] = 1
+        record[12] = brightness
+        record[16] = 40
+        record[20:23] = b'\x10\x20\x30'
+        body += bytes(record)
+    return body + bytes.fromhex('007e')
+
+def state_packet(controller, records, brightness=50):
+    """Build the payload of a 0x43 state packet with one 19 byte record per mesh index in records"""
+    body = int(controller).to_bytes(4, 'big') + bytes.fromhex('010106')
+    for index in records:
+        record = bytearray(19)
+        record[3] = index
+        record[4] = 1
+        record[5] = brightness
+        record[6] = 40
+        record[7:10] = b'\x10\x20\x30'
+        body += bytes(record)
+    return body + bytes(4)
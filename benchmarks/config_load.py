@@ -0,0 +1,34 @@
+"""
+Compare the size and load time of the verbose cync_config (config entry version 2) with the compact one (version 3).
+
+    python benchmarks/config_load.py
+
+Load time is parsing the stored JSON, plus expanding it again for the compact form.
+"""
+import json
+import time
+from common import load_module, synthetic_config
+
+ACCOUNTS = ((1, 50), (1, 250), (4, 250), (10, 250))
+REPEATS = 50
+
+def load_time(text, expand=None):
+    start = time.perf_counter()
+    for repeat in range(REPEATS):
+        cync_config = json.loads(text)
+        if expand is not None:
+            expand(cync_config)
+    return (time.perf_counter() - start)/REPEATS*1000
+
+def main():
+    cync_hub = load_module('cync_hub')
+    print(f"{'homes':>6} {'devices':>8} {'v2 bytes':>10} {'v3 bytes':>10} {'v2 ms':>8} {'v3 ms':>8}")
+    for homes, devices_per_home in ACCOUNTS:
+        cync_config = synthetic_config(homes, devices_per_home, multi_element_every=20)
+        verbose = json.dumps(cync_config)
+        compact = json.dumps(cync_hub.compact_cync_config(cync_config))
+        assert cync_hub.expand_cync_config(json.loads(compact)) == json.loads(verbose)
+        print(f"{homes:>6} {homes*devices_per_home:>8} {len(verbose):>10} {len(compact):>10} {load_time(verbose):>8.2f} {load_time(compact, cync_hub.expand_cync_config):>8.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+Run a real hub against a stand-in Cync server, so login, controller discovery, state refresh, commands with their acks
+and pushed device changes all go through the session code rather than being fed to _handle_packet directly.
+
+    python benchmarks/pipe_session.py          # in memory, through PipeTransport
+    python benchmarks/pipe_session.py --tcp    # over a loopback socket, through HostTransport
+
+Reports the time to log in, to discover the controllers and to refresh the state of the home, the round trip of
+commands from turn_on until the server's ack completes them, and the time from the server pushing a device change
+until the update callback runs on the calling event loop, which stands in for the Home Assistant loop.
+Commands are sent back to back, so the slowest ones include waiting for a token of the per-controller rate limit.
+"""
+import asyncio
+import functools
+import statistics
+import struct
+import sys
+import time
+from common import load_module, state_dump, synthetic_config
+
+DEVICES = 16
+COMMANDS = 200
+PUSHES = 200
+
+def frame(packet_type, payload):
+    return bytes([packet_type]) + len(payload).to_bytes(4, 'big') + payload
+
+def push_payload(controller, seq, mesh_index, brightness):
+    """Build the payload of a 0x73 push reporting a state and brightness change of one device"""
+    payload = bytearray(33)
+    payload[0:4] = int(controller).to_bytes(4, 'big')
+    payload[4:6] = seq.to_bytes(2, 'big')
+    payload[13] = 219
+    payload[21] = mesh_index
+    payload[27] = 1
+    payload[28] = brightness
+    return bytes(payload)
+
+class StandInServer:
+    """
+    Answers a hub connection the way the Cync server does: the first write is the login, heartbeats and controller pings
+    are answered, every command is acked and a state request is followed by a state dump of the home.
+    """
+
+    def __init__(self, home_records):
+        self.home_records = home_records
+        self.connections = []
+
+    def connect(self, send):
+        """Start a connection writing to the hub through send, return the callback taking what the hub writes"""
+        connection = {'send':send, 'logged_in':False, 'buffer':b''}
+        self.connections.append(connection)
+        return functools.partial(self.received, connection)
+
+    def received(self, connection, data):
+        if not connection['logged_in']:
+            connection['logged_in'] = True
+            connection['send'](bytes.fromhex('1800000000'))
+            return
+        buffer = connection['buffer'] + data
+        while len(buffer) >= 5:
+            length = struct.unpack('>I', buffer[1:5])[0]
+            if len(buffer) < 5 + length:
+                break
+            packet_type, payload, buffer = buffer[0], buffer[5:5 + length], buffer[5 + length:]
+            if packet_type == 0x73 and length > 7:
+                #acks written by the hub for our pushes are 7 bytes long and need no answer
+                answer = frame(0x7b, payload[0:6] + b'\x00')
+                if payload[12] == 0xf8 and payload[13] == 0x52:
+                    answer += frame(0x73, state_dump(int.from_bytes(payload[0:4], 'big'), self.home_records))
+                connection['send'](answer)
+            elif packet_type == 0xd3:
+                connection['send'](frame(0xd8, b''))
+            elif packet_type == 0xa3:
+                connection['send'](frame(0xab, payload[0:4]))
+        connection['buffer'] = buffer
+
+    def push(self, payload):
+        self.connections[-1]['send'](frame(0x73, payload))
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return statistics.median(samples), samples[int(len(samples)*0.95) - 1], samples[-1]
+
+async def wait_until(condition, timeout=30):
+    start = time.perf_counter()
+    while not condition():
+        if time.perf_counter() - start > timeout:
+            raise TimeoutError
+        await asyncio.sleep(0.001)
+    return time.perf_counter() - start
+
+async def run(tcp):
+    cync_hub = load_module('cync_hub')
+    transport = load_module('transport')
+    cync_config = synthetic_config(devices_per_home=DEVICES)
+    home_id = next(iter(cync_config['home_devices']))
+    server = StandInServer(sorted(int(index) for index in cync_config['home_devices'][home_id]))
+    ha_loop = asyncio.get_running_loop()
+    hub = None
+
+    if tcp:
+        async def handle(reader, writer):
+            received = server.connect(writer.write)
+            while data := await reader.read(4096):
+                received(data)
+        tcp_server = await asyncio.start_server(handle, '127.0.0.1', 0)
+        transport_factory = functools.partial(transport.HostTransport, host='127.0.0.1', port=tcp_server.sockets[0].getsockname()[1])
+    else:
+        def transport_factory(metrics):
+            pipe = transport.PipeTransport(metrics)
+            #the server also pushes from this loop, so bytes always reach the pipe through the hub loop
+            received = server.connect(lambda data: hub.loop.call_soon_threadsafe(pipe.feed, data))
+            pipe.responder = lambda pipe, data: received(data)
+            return pipe
+
+    options = {'switches':[], 'rooms':[], 'subgroups':[], 'motion_sensors':[], 'ambient_light_sensors':[]}
+    hub = cync_hub.CyncHub({'cync_credentials':[0], 'cync_config':cync_hub.compact_cync_config(cync_config)}, options, lambda: None, transport_factory=transport_factory)
+    hub.ha_loop = ha_loop
+    updated = asyncio.Event()
+    switches = list(hub.cync_switches.values())
+    for switch in switches:
+        switch.register(updated.set)
+
+    hub.start_tcp_client()
+    login = await wait_until(lambda: hub.logged_in)
+    discovery = await wait_until(lambda: all(session.connected_devices_updated for session in hub.sessions))
+    refresh = await hub.async_refresh_state(5)
+
+    commands = []
+    for command in range(COMMANDS):
+        switch = switches[command % len(switches)]
+        start = time.perf_counter()
+        await switch.turn_on(None, 60 + command % 2*60, None)
+        commands.append((time.perf_counter() - start)*1000)
+
+    pushes = []
+    controller = hub.home_controllers[home_id][0]
+    for push in range(PUSHES):
+        switch = switches[push % len(switches)]
+        updated.clear()
+        start = time.perf_counter()
+        #each round over the switches changes the brightness, so no push is dropped as a repeat
+        brightness = 30 + push//len(switches) % 2*30
+        server.push(push_payload(controller, push, hub.home_devices[home_id].index(switch.device_id), brightness))
+        await asyncio.wait_for(updated.wait(), 5)
+        pushes.append((time.perf_counter() - start)*1000)
+
+    metrics = hub.metrics.as_dict()
+    await hub.async_disconnect()
+    if tcp:
+        tcp_server.close()
+
+    print(f"transport: {'HostTransport' if tcp else 'PipeTransport'}, {len(switches)} devices, {len(hub.home_controllers[home_id])} controllers")
+    print(f"login {login*1000:.1f} ms, discovery {discovery:.2f} s, state refresh {refresh['duration']*1000:.1f} ms (complete: {refresh['complete']})")
+    print(f"{'':>10} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for name, samples in (('command', commands), ('push', pushes)):
+        p50, p95, slowest = percentiles(samples)
+        print(f"{name:>10} {len(samples):>6} {p50:>8.2f} {p95:>8.2f} {slowest:>8.2f}")
+    print(f"acked {metrics['commands_acked']}/{metrics['commands_sent']}, retried {metrics['commands_retried']}, timed out {metrics['commands_timed_out']}, push acks {metrics['push_acks']}")
+
+def main():
+    asyncio.run(run('--tcp' in sys.argv[1:]))
+
+if __name__ == '__main__':
+    main()
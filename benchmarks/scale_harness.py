@@ -0,0 +1,124 @@
+"""
+Build real hubs from synthetic topologies of growing size and drive the room and switch model without a connection.
+
+    python benchmarks/scale_harness.py
+
+For every topology this reports the time to build the hub, the peak memory of building it and running each workload once,
+and the throughput of:
+  - switch update storms, every switch changing state through update_switch and its rooms through update_room
+  - initial 0x52 state dumps of every home
+  - controller churn, every controller of a home leaving and joining again through _add_connected_devices,
+    followed by the full update_controllers rebuild done at the end of discovery
+Throughput per device should stay roughly flat as the topologies grow, a falling rate shows a scaling problem in the model.
+"""
+import time
+import tracemalloc
+from common import load_module, state_dump, synthetic_config, synthetic_hub
+
+# devices, devices per home, devices per room, subgroups per room
+TOPOLOGIES = (
+    (10, 10, 1, 0),
+    (100, 100, 10, 0),
+    (250, 250, 25, 2),
+    (1000, 250, 50, 2),
+    (1000, 250, 100, 4),
+    (5000, 250, 10, 1),
+    (5000, 250, 100, 4),
+)
+STORM_ROUNDS = 4
+DUMP_ROUNDS = 4
+CHURN_ROUNDS = 2
+
+def build(cync_hub, cync_config):
+    hub = synthetic_hub(cync_hub, cync_config)
+    #stand in for the entities, so every change goes through the state write path
+    for device in [*hub.cync_rooms.values(), *hub.cync_switches.values()]:
+        device.register(lambda: None)
+    return hub
+
+def switch_storm(hub, rounds):
+    """Change the brightness of every switch, return the number of updates"""
+    switches = list(hub.cync_switches.values())
+    for round in range(rounds):
+        brightness = 30 if round % 2 == 0 else 60
+        for switch in switches:
+            switch.update_switch(True, brightness, switch.color_temp, switch.rgb)
+    return rounds*len(switches)
+
+def state_dumps(hub, rounds):
+    """Deliver a 0x52 state dump covering every device of every home, return the number of records decoded"""
+    packets = []
+    for home_id, controllers in hub.home_controllers.items():
+        records = sorted(index for index in hub.home_devices[home_id].devices if index < 256)
+        session = hub.controller_sessions[controllers[0]]
+        packets.append((session, [bytearray(state_dump(controllers[0], records, brightness)) for brightness in (20, 80)], len(records)))
+    count = 0
+    for round in range(rounds):
+        for session, dumps, records in packets:
+            packet = dumps[round % 2]
+            hub._handle_packet(session, 115, packet, len(packet))
+            count += records
+    return count
+
+def controller_churn(hub, rounds):
+    """Let every controller of every home leave and join again, return the number of joins and the time spent rebuilding"""
+    for session in hub.sessions:
+        session.connected_devices_updated = True
+    views = [*hub.cync_switches.values(), *hub.cync_rooms.values()]
+    joins = 0
+    rebuild = 0
+    for round in range(rounds):
+        for home_id in hub.connected_devices:
+            hub.connected_devices[home_id] = {}
+        start = time.perf_counter()
+        for device in views:
+            device.update_controllers()
+        rebuild += time.perf_counter() - start
+        for home_id, controllers in hub.home_controllers.items():
+            session = hub.controller_sessions[controllers[0]]
+            for controller in controllers:
+                hub._add_connected_devices(session, str(controller), home_id)
+                joins += 1
+        #a command reads the controllers of the room it targets
+        for room in hub.cync_rooms.values():
+            room.controllers
+    return joins, rebuild/rounds
+
+def rate(count, elapsed):
+    return count/elapsed if elapsed > 0 else float('inf')
+
+def main():
+    cync_hub = load_module('cync_hub')
+    print(f"{'devices':>8} {'room':>5} {'subgr':>5} {'rooms':>6} {'build ms':>9} {'peak MiB':>9} {'updates/s':>10} {'records/s':>10} {'joins/s':>9} {'rebuild ms':>10}")
+    for devices, devices_per_home, devices_per_room, subgroups_per_room in TOPOLOGIES:
+        cync_config = synthetic_config(devices//devices_per_home, devices_per_home, devices_per_room=devices_per_room, subgroups_per_room=subgroups_per_room)
+
+        start = time.perf_counter()
+        hub = build(cync_hub, cync_config)
+        build_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        updates = switch_storm(hub, STORM_ROUNDS)
+        update_rate = rate(updates, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        records = state_dumps(hub, DUMP_ROUNDS)
+        record_rate = rate(records, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        joins, rebuild_time = controller_churn(hub, CHURN_ROUNDS)
+        join_rate = rate(joins, time.perf_counter() - start - rebuild_time*CHURN_ROUNDS)
+
+        #memory is measured on a second hub, tracing allocations slows down everything it sees
+        tracemalloc.start()
+        hub = build(cync_hub, cync_config)
+        switch_storm(hub, 1)
+        state_dumps(hub, 1)
+        controller_churn(hub, 1)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        print(f"{devices:>8} {devices_per_room:>5} {subgroups_per_room:>5} {len(hub.cync_rooms):>6} {build_time*1000:>9.1f} {peak/2**20:>9.1f} {update_rate:>10.0f} {record_rate:>10.0f} {join_rate:>9.0f} {rebuild_time*1000:>10.1f}")
+
+if __name__ == '__main__':
+    main()
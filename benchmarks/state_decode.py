@@ -0,0 +1,36 @@
+"""
+Time the decoding of 0x52 state dumps and 0x43 state packets for growing numbers of devices.
+
+    python benchmarks/state_decode.py
+
+The time per record should stay roughly flat as the number of records grows.
+"""
+import time
+from common import load_module, state_dump, state_packet, synthetic_config, synthetic_hub
+
+DEVICE_COUNTS = (25, 50, 100, 250)
+REPEATS = 200
+
+def main():
+    cync_hub = load_module('cync_hub')
+    print(f"{'devices':>8} {'0x52 us':>10} {'us/record':>10} {'0x43 us':>10} {'us/record':>10}")
+    for count in DEVICE_COUNTS:
+        hub = synthetic_hub(cync_hub, synthetic_config(devices_per_home=count, multi_element_every=10))
+        session = hub.sessions[0]
+        home_id = next(iter(hub.home_controllers))
+        controller = hub.home_controllers[home_id][0]
+        records = range(1, count + 1)
+        results = []
+        for packet_type, build in ((115, state_dump), (67, state_packet)):
+            packets = [bytearray(build(controller, records, brightness)) for brightness in (30, 60)]
+            start = time.perf_counter()
+            #alternate between two brightness levels so every record is a real change
+            for repeat in range(REPEATS):
+                packet = packets[repeat % 2]
+                hub._handle_packet(session, packet_type, packet, len(packet))
+            elapsed = (time.perf_counter() - start)/REPEATS*1e6
+            results += [elapsed, elapsed/count]
+        print(f"{count:>8} {results[0]:>10.1f} {results[1]:>10.2f} {results[2]:>10.1f} {results[3]:>10.2f}")
+
+if __name__ == '__main__':
+    main()
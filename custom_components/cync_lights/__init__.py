@@ -3,21 +3,48 @@ from __future__ import annotations
 
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
 from .const import DOMAIN
-from .cync_hub import CyncHub
+from .cync_hub import CyncHub, compact_cync_config
+from .services import async_setup_services, async_unload_services
 
-PLATFORMS: list[str] = ["light","binary_sensor","switch","fan"]
+PLATFORMS: list[str] = ["light","binary_sensor","switch","fan","sensor"]
+STORAGE_VERSION = 1
+#seconds between writes of the last known device state
+STATE_SAVE_DELAY = 30
+
+def _state_store(hass: HomeAssistant, entry: ConfigEntry) -> Store:
+    return Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}.state")
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up Cync Room Lights from a config entry."""
 
     hass.data.setdefault(DOMAIN, {})
     remove_options_update_listener = entry.add_update_listener(options_update_listener)
-    hub = CyncHub(entry.data, entry.options, remove_options_update_listener)
+    store = _state_store(hass, entry)
+    hub = CyncHub(entry.data, entry.options, remove_options_update_listener, await store.async_load())
+    #called from the hub thread only when the state first becomes dirty, the store batches the writes
+    hub.set_state_saver(lambda: hass.loop.call_soon_threadsafe(store.async_delay_save, hub.state_snapshot, STATE_SAVE_DELAY))
+    #the hub hands its state changes to the Home Assistant loop in batches
+    hub.ha_loop = hass.loop
     hass.data[DOMAIN][entry.entry_id] = hub
     hub.start_tcp_client()
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    await async_setup_services(hass)
+
+    return True
 
+async def async_migrate_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+    """Migrate an old config entry."""
+    if entry.version > 3:
+        return False
+    if entry.version == 1:
+        #the device list of each home was padded out to the highest mesh index, keep only the occupied indexes
+        cync_config = dict(entry.data["cync_config"])
+        cync_config["home_devices"] = {home_id:{str(index):device_id for index, device_id in enumerate(devices) if device_id} for home_id, devices in cync_config["home_devices"].items()}
+        hass.config_entries.async_update_entry(entry, data={**entry.data, "cync_config":cync_config}, version=2)
+    if entry.version == 2:
+        hass.config_entries.async_update_entry(entry, data={**entry.data, "cync_config":compact_cync_config(entry.data["cync_config"])}, version=3)
     return True
 
 async def options_update_listener(
@@ -30,9 +57,14 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
     hub = hass.data[DOMAIN][entry.entry_id]
     hub.remove_options_update_listener()
-    hub.disconnect()
+    await hub.async_disconnect()
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if unload_ok:
         hass.data[DOMAIN].pop(entry.entry_id)
+        async_unload_services(hass)
 
     return unload_ok
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Remove the saved device state of a config entry."""
+    await _state_store(hass, entry).async_remove()
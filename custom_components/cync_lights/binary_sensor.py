@@ -6,6 +6,7 @@ from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from homeassistant.helpers.entity import DeviceInfo
+from homeassistant.util import dt as dt_util
 from .const import DOMAIN
 
 async def async_setup_entry(
@@ -31,93 +32,70 @@ class CyncMotionSensorEntity(BinarySensorEntity):
     """Representation of a Cync Motion Sensor."""
 
     should_poll = False
+    _attr_device_class = BinarySensorDeviceClass.MOTION
 
     def __init__(self, motion_sensor) -> None:
         """Initialize the sensor."""
         self.motion_sensor = motion_sensor
-
-    async def async_added_to_hass(self) -> None:
-        """Run when this Entity has been added to HA."""
-        self.motion_sensor.register(self.schedule_update_ha_state)
-
-    async def async_will_remove_from_hass(self) -> None:
-        """Entity being removed from hass."""
-        self.motion_sensor.reset()
-
-    @property
-    def device_info(self) -> DeviceInfo:
-        """Return device registry information for this entity."""
-        return DeviceInfo(
+        self._attr_device_info = DeviceInfo(
             identifiers = {(DOMAIN, f"{self.motion_sensor.room.name} ({self.motion_sensor.home_name})")},
             manufacturer = "Cync by Savant",
             name = f"{self.motion_sensor.room.name} ({self.motion_sensor.home_name})",
             suggested_area = f"{self.motion_sensor.room.name}",
         )
+        self._attr_unique_id = 'cync_motion_sensor_' + self.motion_sensor.device_id
+        self._attr_name = self.motion_sensor.name + " Motion"
+        self._attr_is_on = self.motion_sensor.motion
 
-    @property
-    def unique_id(self) -> str:
-        """Return Unique ID string."""
-        return 'cync_motion_sensor_' + self.motion_sensor.device_id
-
-    @property
-    def name(self) -> str:
-        """Return the name of the motion_sensor."""
-        return self.motion_sensor.name + " Motion"
+    async def async_added_to_hass(self) -> None:
+        """Run when this Entity has been added to HA."""
+        self.motion_sensor.register(self._handle_update)
 
-    @property
-    def is_on(self) -> bool | None:
-        """Return true if light is on."""
-        return self.motion_sensor.motion
+    async def async_will_remove_from_hass(self) -> None:
+        """Entity being removed from hass."""
+        self.motion_sensor.reset()
 
-    @property
-    def device_class(self) -> str | None:
-        """Return the device class"""
-        return BinarySensorDeviceClass.MOTION
+    def _handle_update(self) -> None:
+        """Refresh the state attributes and write the state, called on the Home Assistant loop."""
+        self._attr_is_on = self.motion_sensor.motion
+        self._attr_extra_state_attributes = _event_attributes(self.motion_sensor)
+        self.async_write_ha_state()
 
 class CyncAmbientLightSensorEntity(BinarySensorEntity):
     """Representation of a Cync Ambient Light Sensor."""
 
     should_poll = False
+    _attr_device_class = BinarySensorDeviceClass.LIGHT
 
     def __init__(self, ambient_light_sensor) -> None:
         """Initialize the sensor."""
         self.ambient_light_sensor = ambient_light_sensor
-
-    async def async_added_to_hass(self) -> None:
-        """Run when this Entity has been added to HA."""
-        self.ambient_light_sensor.register(self.schedule_update_ha_state)
-
-    async def async_will_remove_from_hass(self) -> None:
-        """Entity being removed from hass."""
-        self.ambient_light_sensor.reset()
-
-    @property
-    def device_info(self) -> DeviceInfo:
-        """Return device registry information for this entity."""
-        return DeviceInfo(
+        self._attr_device_info = DeviceInfo(
             identifiers = {(DOMAIN, f"{self.ambient_light_sensor.room.name} ({self.ambient_light_sensor.home_name})")},
             manufacturer = "Cync by Savant",
             name = f"{self.ambient_light_sensor.room.name} ({self.ambient_light_sensor.home_name})",
             suggested_area = f"{self.ambient_light_sensor.room.name}",
         )
+        self._attr_unique_id = 'cync_ambient_light_sensor_' + self.ambient_light_sensor.device_id
+        self._attr_name = self.ambient_light_sensor.name + " Ambient Light"
+        self._attr_is_on = self.ambient_light_sensor.ambient_light
 
-    @property
-    def unique_id(self) -> str:
-        """Return Unique ID string."""
-        return 'cync_ambient_light_sensor_' + self.ambient_light_sensor.device_id
-
-    @property
-    def name(self) -> str:
-        """Return the name of the ambient_light_sensor."""
-        return self.ambient_light_sensor.name + " Ambient Light"
-
-    @property
-    def is_on(self) -> bool | None:
-        """Return true if light is on."""
-        return self.ambient_light_sensor.ambient_light
+    async def async_added_to_hass(self) -> None:
+        """Run when this Entity has been added to HA."""
+        self.ambient_light_sensor.register(self._handle_update)
 
-    @property
-    def device_class(self) -> str | None:
-        """Return the device class"""
-        return BinarySensorDeviceClass.LIGHT
+    async def async_will_remove_from_hass(self) -> None:
+        """Entity being removed from hass."""
+        self.ambient_light_sensor.reset()
 
+    def _handle_update(self) -> None:
+        """Refresh the state attributes and write the state, called on the Home Assistant loop."""
+        self._attr_is_on = self.ambient_light_sensor.ambient_light
+        self._attr_extra_state_attributes = _event_attributes(self.ambient_light_sensor)
+        self.async_write_ha_state()
+
+def _event_attributes(sensor) -> dict[str, Any] | None:
+    """Return when the last change of a sensor was read from the Cync server and how long it took to reach its state write."""
+    if sensor.last_event is None:
+        return None
+    return {"last_event": dt_util.utc_from_timestamp(sensor.last_event).isoformat(), "latency_ms": sensor.latency_ms}
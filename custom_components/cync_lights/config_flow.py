@@ -9,7 +9,7 @@ from homeassistant.exceptions import HomeAssistantError
 from homeassistant.helpers import config_validation as cv
 from homeassistant.core import callback
 from .const import DOMAIN
-from .cync_hub import CyncUserData
+from .cync_hub import CyncUserData, compact_cync_config, expand_cync_config
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -54,7 +54,7 @@ class CyncConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         self.data ={}
         self.options = {}
 
-    VERSION = 1
+    VERSION = 3
 
     async def async_step_user(
         self, user_input: dict[str, Any] | None = None
@@ -154,10 +154,11 @@ class CyncConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
         """Finish setup and create entry"""
 
         existing_entry = await self.async_set_unique_id(self.data['title'])
+        data = {**self.data["data"], "cync_config":compact_cync_config(self.data["data"]["cync_config"])}
         if not existing_entry:              
-            return self.async_create_entry(title=self.data["title"], data=self.data["data"], options=self.options)
+            return self.async_create_entry(title=self.data["title"], data=data, options=self.options)
         else:
-            self.hass.config_entries.async_update_entry(existing_entry, data=self.data['data'], options=self.options)
+            self.hass.config_entries.async_update_entry(existing_entry, data=data, options=self.options)
             await self.hass.config_entries.async_reload(existing_entry.entry_id)
             return self.hass.config_entries.async_abort(reason="reauth_successful")
 
@@ -175,6 +176,7 @@ class CyncOptionsFlowHandler(config_entries.OptionsFlow):
         self.entry = config_entry
         self.cync_hub = CyncUserData()
         self.data = {}
+        self.tuning = {}
 
     async def async_step_init(
         self, user_input: dict[str, Any] | None = None
@@ -182,6 +184,7 @@ class CyncOptionsFlowHandler(config_entries.OptionsFlow):
         """Manage the options."""
 
         if user_input is not None:
+            self.tuning = {key:value for key,value in user_input.items() if key != 're-authenticate'}
             if user_input['re-authenticate'] == "No":
                 return await self.async_step_select_switches()
             else:
@@ -191,6 +194,18 @@ class CyncOptionsFlowHandler(config_entries.OptionsFlow):
             {
                 vol.Required(
                     "re-authenticate",default="No"): vol.In(["Yes","No"]),
+                vol.Optional(
+                    "heartbeat_interval",default=self.entry.options.get("heartbeat_interval",180)): vol.All(vol.Coerce(int), vol.Range(min=10, max=600)),
+                vol.Optional(
+                    "session_mode",default=self.entry.options.get("session_mode","single")): vol.In(["single","per_home"]),
+                vol.Optional(
+                    "controllers_per_session",default=self.entry.options.get("controllers_per_session",0)): vol.All(vol.Coerce(int), vol.Range(min=0)),
+                vol.Optional(
+                    "transition_rate",default=self.entry.options.get("transition_rate",5)): vol.All(vol.Coerce(float), vol.Range(min=0.5, max=50)),
+                vol.Optional(
+                    "controller_rate_limit",default=self.entry.options.get("controller_rate_limit",10)): vol.All(vol.Coerce(float), vol.Range(min=1, max=1000)),
+                vol.Optional(
+                    "connection_rate_limit",default=self.entry.options.get("connection_rate_limit",50)): vol.All(vol.Coerce(float), vol.Range(min=1, max=1000)),
             }
         )
 
@@ -249,34 +264,37 @@ class CyncOptionsFlowHandler(config_entries.OptionsFlow):
     ) -> FlowResult:
         """Manage the options."""
 
-        if "data" in self.data and self.data["data"] != self.entry.data:
-            self.hass.config_entries.async_update_entry(self.entry, data = self.data["data"])
+        if "data" in self.data:
+            data = {**self.data["data"], "cync_config":compact_cync_config(self.data["data"]["cync_config"])}
+            if data != self.entry.data:
+                self.hass.config_entries.async_update_entry(self.entry, data = data)
 
         if user_input is not None:
-            return self.async_create_entry(title="",data=user_input)
+            return self.async_create_entry(title="",data={**user_input, **self.tuning})
 
+        cync_config = expand_cync_config(self.entry.data["cync_config"])
         switches_data_schema = vol.Schema(
             {
                 vol.Optional(
                     "rooms",
-                    description = {"suggested_value" : [room for room in self.entry.options["rooms"] if room in self.entry.data["cync_config"]["rooms"].keys()]},
-                ): cv.multi_select({room : f'{room_info["name"]} ({room_info["home_name"]})' for room,room_info in self.entry.data["cync_config"]["rooms"].items() if not self.data["data"]["cync_config"]["rooms"][room]['isSubgroup']}),
+                    description = {"suggested_value" : [room for room in self.entry.options["rooms"] if room in cync_config["rooms"].keys()]},
+                ): cv.multi_select({room : f'{room_info["name"]} ({room_info["home_name"]})' for room,room_info in cync_config["rooms"].items() if not cync_config["rooms"][room]['isSubgroup']}),
                 vol.Optional(
                     "subgroups",
-                    description = {"suggested_value" : [room for room in self.entry.options["subgroups"] if room in self.entry.data["cync_config"]["rooms"].keys()]},
-                ): cv.multi_select({room : f'{room_info["name"]} ({room_info.get("parent_room","")}:{room_info["home_name"]})' for room,room_info in self.entry.data["cync_config"]["rooms"].items() if self.data["data"]["cync_config"]["rooms"][room]['isSubgroup']}),
+                    description = {"suggested_value" : [room for room in self.entry.options["subgroups"] if room in cync_config["rooms"].keys()]},
+                ): cv.multi_select({room : f'{room_info["name"]} ({room_info.get("parent_room","")}:{room_info["home_name"]})' for room,room_info in cync_config["rooms"].items() if cync_config["rooms"][room]['isSubgroup']}),
                 vol.Optional(
                     "switches",
-                    description = {"suggested_value" : [sw for sw in self.entry.options["switches"] if sw in self.entry.data["cync_config"]["devices"].keys()]},
-                ): cv.multi_select({switch_id : f'{sw_info["name"]} ({sw_info["room_name"]}:{sw_info["home_name"]})' for switch_id,sw_info in self.entry.data["cync_config"]["devices"].items() if sw_info.get('ONOFF',False) and sw_info.get('MULTIELEMENT',1) == 1}),
+                    description = {"suggested_value" : [sw for sw in self.entry.options["switches"] if sw in cync_config["devices"].keys()]},
+                ): cv.multi_select({switch_id : f'{sw_info["name"]} ({sw_info["room_name"]}:{sw_info["home_name"]})' for switch_id,sw_info in cync_config["devices"].items() if sw_info.get('ONOFF',False) and sw_info.get('MULTIELEMENT',1) == 1}),
                 vol.Optional(
                     "motion_sensors",
-                    description = {"suggested_value" : [sensor for sensor in self.entry.options["motion_sensors"] if sensor in self.entry.data["cync_config"]["devices"].keys()]},
-                ): cv.multi_select({device_id : f'{device_info["name"]} ({device_info["room_name"]}:{device_info["home_name"]})' for device_id,device_info in self.entry.data["cync_config"]["devices"].items() if device_info.get('MOTION',False)}),
+                    description = {"suggested_value" : [sensor for sensor in self.entry.options["motion_sensors"] if sensor in cync_config["devices"].keys()]},
+                ): cv.multi_select({device_id : f'{device_info["name"]} ({device_info["room_name"]}:{device_info["home_name"]})' for device_id,device_info in cync_config["devices"].items() if device_info.get('MOTION',False)}),
                 vol.Optional(
                     "ambient_light_sensors",
-                    description = {"suggested_value" : [sensor for sensor in self.entry.options["ambient_light_sensors"] if sensor in self.entry.data["cync_config"]["devices"].keys()]},
-                ): cv.multi_select({device_id : f'{device_info["name"]} ({device_info["room_name"]}:{device_info["home_name"]})' for device_id,device_info in self.entry.data["cync_config"]["devices"].items() if device_info.get('AMBIENT_LIGHT',False)}),
+                    description = {"suggested_value" : [sensor for sensor in self.entry.options["ambient_light_sensors"] if sensor in cync_config["devices"].keys()]},
+                ): cv.multi_select({device_id : f'{device_info["name"]} ({device_info["room_name"]}:{device_info["home_name"]})' for device_id,device_info in cync_config["devices"].items() if device_info.get('AMBIENT_LIGHT',False)}),
             }
         )
 
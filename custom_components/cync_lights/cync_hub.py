@@ -1,11 +1,18 @@
 import logging
+import os
+import sys
 import threading
 import asyncio
 import struct
 import aiohttp
 import math
-import ssl
+import time
+import bisect
+import tracemalloc
+from collections import deque
+from concurrent.futures import Future
 from typing import Any
+from .transport import CloudTransport
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -27,34 +34,475 @@ Capabilities = {
     "FAN":[81],
     "MULTIELEMENT":{'67':2}
 }
+#bit order of the capability mask in the stored config
+CAPABILITY_FLAGS = ("ONOFF","BRIGHTNESS","COLORTEMP","RGB","MOTION","AMBIENT_LIGHT","WIFICONTROL","PLUG","FAN")
+
+PACKET_TYPE_NAMES = {67:'state', 115:'push', 123:'command_ack', 131:'broadcast', 171:'controller_info', 216:'keepalive_ack'}
+TRANSITION_TICK = 0.2
+#outbound priority classes, lower values are written first
+PRIORITY_CONTROL = 0
+PRIORITY_ACK = 1
+PRIORITY_STATE = 2
+PRIORITY_DISCOVERY = 3
+PRIORITY_NAMES = ('control','ack','state','discovery')
+#a request that has waited this long is written ahead of higher classes so it is never starved
+PRIORITY_MAX_WAIT = 1.0
+#seconds during which a repeat of the same device change, via the 0x73 or 0x83 path, is dropped
+PUSH_DEDUP_TTL = 2.0
+#records of the 0x52 state dump: mesh index, state, brightness, color temp, r, g, b
+STATE_DUMP_RECORD = struct.Struct('>B7xB3xB3xB3x3Bx')
+#records of the 0x43 state packet: mesh index, state, brightness, color temp, r, g, b
+STATE_PACKET_RECORD = struct.Struct('>3x7B9x')
+#seconds to wait for the hub thread to stop on unload
+#a 0x52 dump carries no end marker, it is taken as finished once no chunk has arrived for this long
+STATE_DUMP_GAP = 0.3
+SHUTDOWN_TIMEOUT = 5
+LOOP_LAG_TIMEOUT = 2
+#number of commands tracked after they are sent, older entries are overwritten
+SEQUENCE_WINDOW_SIZE = 4096
+LATENCY_BUCKETS_MS = (5, 10, 20, 50, 100, 200, 300, 500, 750, 1000, 2000, 5000)
+PROFILE_SAMPLE_INTERVAL = 0.005
+
+class CyncHistogram:
+    """Fixed-bucket histogram, cheap enough to record into from the packet loop"""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0]*(len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def record(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def percentile(self, percent):
+        """Return the upper bound of the bucket holding the given percentile, None if nothing was recorded"""
+        if self.count == 0:
+            return None
+        rank = max(1, math.ceil(self.count*percent/100))
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return self.bounds[min(index, len(self.bounds) - 1)]
+        return self.bounds[-1]
+
+    def as_dict(self):
+        return {'count':self.count, 'mean':round(self.total/self.count, 1) if self.count else None, 'p50':self.percentile(50), 'p95':self.percentile(95), 'p99':self.percentile(99)}
+
+class CyncTokenBucket:
+    """Token bucket allowing rate requests per second with bursts of up to burst requests"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def delay(self, now):
+        """Return how long until a token is available, 0 if one is available now"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated)*self.rate)
+        self.updated = now
+        return 0 if self.tokens >= 1 else (1 - self.tokens)/self.rate
+
+    def consume(self):
+        self.tokens -= 1
+
+class CyncStackSampler:
+    """
+    Sampling profiler for a single thread. From Python 3.12 on cProfile is enabled for every thread of the process, so
+    profiling the hub with it would mix in the Home Assistant event loop. Instead the stack of the hub thread is read from
+    sys._current_frames every interval seconds by a separate thread and counted per call stack.
+    """
+
+    def __init__(self, thread_ident, interval=PROFILE_SAMPLE_INTERVAL):
+        self.thread_ident = thread_ident
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="cync_lights profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_ident)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                stack = tuple(reversed(stack))
+                self.stacks[stack] = self.stacks.get(stack, 0) + 1
+                self.samples += 1
+
+    def collapsed(self):
+        """Return the samples in collapsed stack format, one 'outer;...;inner count' line per call stack"""
+        return [f"{';'.join(stack)} {count}" for stack, count in sorted(self.stacks.items(), key=lambda item: item[1], reverse=True)]
+
+    def top_functions(self, limit=50):
+        """Return (function, own samples, total samples) of the functions with the most own samples"""
+        own = {}
+        total = {}
+        for stack, count in self.stacks.items():
+            own[stack[-1]] = own.get(stack[-1], 0) + count
+            for function in set(stack):
+                total[function] = total.get(function, 0) + count
+        return [(function, count, total[function]) for function, count in sorted(own.items(), key=lambda item: item[1], reverse=True)[:limit]]
+
+class CyncHubMetrics:
+    """Counters for the hub hot path, updated in place without allocation"""
+
+    def __init__(self):
+        self.frames_received = [0]*256
+        self.decode_errors = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.commands_sent = 0
+        self.commands_retried = 0
+        self.commands_acked = 0
+        self.commands_timed_out = 0
+        self.ack_latency = CyncHistogram(LATENCY_BUCKETS_MS)
+        self.queue_wait = CyncHistogram(LATENCY_BUCKETS_MS)
+        self.sensor_latency = CyncHistogram(LATENCY_BUCKETS_MS)
+        self.requests_written = [0]*len(PRIORITY_NAMES)
+        self.requests_aged = 0
+        self.state_writes = 0
+        self.state_write_batches = 0
+        self.updates_suppressed = 0
+        self.pushes_deduplicated = 0
+        self.push_acks = 0
+        self.transition_steps = 0
+        self.reconnects = 0
+        self.last_frame_at = None
+        self.keepalive_rtt = None
+        self.stale_connections = 0
+        self.rtt = None
+        self.rtt_variance = None
+        self.acks_late = 0
+        self.acks_duplicate = 0
+        self.acks_unmatched = 0
+        self.sequence_collisions = 0
+
+    def command_sent(self, attempt):
+        self.commands_sent += 1
+        if attempt > 0:
+            self.commands_retried += 1
+
+    def command_acked(self, sample):
+        self.commands_acked += 1
+        self.ack_latency.record(sample)
+        #smoothed round trip estimate as in RFC 6298
+        if self.rtt is None:
+            self.rtt = sample
+            self.rtt_variance = sample/2
+        else:
+            self.rtt_variance = 0.75*self.rtt_variance + 0.25*abs(self.rtt - sample)
+            self.rtt = 0.875*self.rtt + 0.125*sample
+
+    def frames_by_type(self):
+        return {PACKET_TYPE_NAMES.get(packet_type, f'0x{packet_type:02x}'):count for packet_type, count in enumerate(self.frames_received) if count > 0}
+
+    def as_dict(self):
+        return {
+            'frames_received':self.frames_by_type(),
+            'decode_errors':self.decode_errors,
+            'bytes_in':self.bytes_in,
+            'bytes_out':self.bytes_out,
+            'commands_sent':self.commands_sent,
+            'commands_retried':self.commands_retried,
+            'commands_acked':self.commands_acked,
+            'commands_timed_out':self.commands_timed_out,
+            'ack_latency_ms':self.ack_latency.as_dict(),
+            'acks_late':self.acks_late,
+            'acks_duplicate':self.acks_duplicate,
+            'acks_unmatched':self.acks_unmatched,
+            'sequence_collisions':self.sequence_collisions,
+            'queue_wait_ms':self.queue_wait.as_dict(),
+            'sensor_latency_ms':self.sensor_latency.as_dict(),
+            'requests_written':dict(zip(PRIORITY_NAMES, self.requests_written)),
+            'requests_aged':self.requests_aged,
+            'state_writes':self.state_writes,
+            'state_write_batches':self.state_write_batches,
+            'updates_suppressed':self.updates_suppressed,
+            'pushes_deduplicated':self.pushes_deduplicated,
+            'push_acks':self.push_acks,
+            'transition_steps':self.transition_steps,
+            'reconnects':self.reconnects,
+            'stale_connections':self.stale_connections,
+            'keepalive_rtt_ms':round(self.keepalive_rtt, 1) if self.keepalive_rtt is not None else None,
+            'rtt_estimate_ms':round(self.rtt, 1) if self.rtt is not None else None,
+            'rtt_variance_ms':round(self.rtt_variance, 1) if self.rtt_variance is not None else None,
+            'seconds_since_last_frame':round(time.monotonic() - self.last_frame_at, 1) if self.last_frame_at is not None else None,
+        }
+
+class CyncInFlightCommand:
+    """One attempt at sending a command, kept in the sequence window until its slot is reused"""
+
+    __slots__ = ('seq', 'command', 'attempt', 'controller', 'sent_at', 'state')
+
+    QUEUED = 0
+    SENT = 1
+    ACKED = 2
+    EXPIRED = 3
+    #a fire-and-forget request, nothing waits for its ack
+    UNTRACKED = 4
+
+    def __init__(self, seq, command, attempt, controller):
+        self.seq = seq
+        self.command = command
+        self.attempt = attempt
+        self.controller = controller
+        self.sent_at = time.monotonic()
+        self.state = self.QUEUED
+
+class CyncStateRequest:
+    """
+    State request sent to one controller of a home by a refresh. It is answered once the 0x52 dump of that controller
+    has finished, which is when it has carried a record for every device of the home or has gone quiet for STATE_DUMP_GAP.
+    """
+
+    def __init__(self, controller, indexes, loop):
+        self.controller = str(controller)
+        self.remaining = set(indexes)
+        self.answered = loop.create_future()
+        self.last_chunk_at = None
+        self._gap = None
+
+    def received(self, indexes, now):
+        """Take one chunk of the dump, given the mesh indexes of its records"""
+        self.last_chunk_at = now
+        self.remaining.difference_update(indexes)
+        self.cancel()
+        if len(self.remaining) == 0:
+            self.answered.set_result(now)
+        else:
+            self._gap = self.answered.get_loop().call_later(STATE_DUMP_GAP, self._gap_expired)
+
+    def _gap_expired(self):
+        if not self.answered.done():
+            self.answered.set_result(self.last_chunk_at)
+
+    def cancel(self):
+        if self._gap is not None:
+            self._gap.cancel()
+            self._gap = None
+
+class CyncMeshIndex:
+    """
+    Two way map between the mesh indexes of one home and its device ids.
+    Only occupied indexes are stored, so gaps in the mesh cost nothing and looking up an index
+    that no device holds returns None instead of raising.
+    """
+
+    __slots__ = ('devices', 'indexes')
+
+    def __init__(self, devices):
+        #the config entry stores the mesh indexes as strings
+        self.devices = {int(index):device_id for index, device_id in devices.items()}
+        self.indexes = {device_id:index for index, device_id in self.devices.items()}
+
+    def device(self, index):
+        return self.devices.get(index)
+
+    def index(self, device_id):
+        return self.indexes.get(device_id)
+
+    def __contains__(self, device_id):
+        return device_id in self.indexes
+
+    def __len__(self):
+        return len(self.devices)
+
+class CyncControllerView:
+    """
+    Ordered controllers to try for one room or switch: the controllers of its own devices first, in preference order,
+    then every other connected controller of the home in the order they joined.
+    A joining controller is inserted in place, the list handed out is only rebuilt when it is next read.
+    """
+
+    __slots__ = ('default_controller', 'positions', 'preferred', 'others', '_controllers')
+
+    def __init__(self, default_controller):
+        self.default_controller = default_controller
+        self.positions = {}
+        self.preferred = []
+        self.others = []
+        self._controllers = []
+
+    def rebuild(self, preferred_devices, connected_devices, cync_switches):
+        """Recompute the view from the preferred device ids and the ordered set of connected devices of the home"""
+        self.positions = {}
+        for device_id in preferred_devices:
+            self.positions.setdefault(device_id, len(self.positions))
+        self.preferred = sorted((position, cync_switches[device_id].switch_id) for device_id, position in self.positions.items() if device_id in connected_devices)
+        self.others = [cync_switches[device_id].switch_id for device_id in connected_devices if device_id not in self.positions]
+        self._controllers = None
+
+    def joined(self, device_id, switch_id):
+        position = self.positions.get(device_id)
+        if position is None:
+            self.others.append(switch_id)
+        else:
+            bisect.insort(self.preferred, (position, switch_id))
+        self._controllers = None
+
+    @property
+    def controllers(self):
+        if self._controllers is None:
+            if len(self.preferred) + len(self.others) > 0:
+                self._controllers = [switch_id for position, switch_id in self.preferred] + self.others
+            else:
+                self._controllers = [self.default_controller]
+        return self._controllers
+
+class CyncSequenceWindow:
+    """
+    Bounded ring of recently sent commands indexed by sequence number.
+    Expired attempts stay in the ring, so an ack that arrives after its deadline is still matched to
+    its command and counted as late, and a second ack for the same sequence number is counted as a duplicate.
+    """
+
+    def __init__(self, metrics, size=SEQUENCE_WINDOW_SIZE):
+        self.metrics = metrics
+        self.slots = [None]*size
+
+    def open(self, seq, command, attempt, controller):
+        entry = CyncInFlightCommand(seq, command, attempt, controller)
+        self._store(entry)
+        return entry
+
+    def open_untracked(self, seq):
+        """Take the slot of a fire-and-forget request, such as a state request or a transition step, so its ack is not counted as unmatched"""
+        entry = CyncInFlightCommand(seq, None, 0, None)
+        entry.state = CyncInFlightCommand.UNTRACKED
+        self._store(entry)
+
+    def _store(self, entry):
+        slot = entry.seq % len(self.slots)
+        previous = self.slots[slot]
+        if previous is not None and previous.state in (CyncInFlightCommand.QUEUED, CyncInFlightCommand.SENT):
+            #the sequence numbers wrapped round to a command that is still waiting for its ack
+            self.metrics.sequence_collisions += 1
+        self.slots[slot] = entry
+
+    def get(self, seq):
+        entry = self.slots[seq % len(self.slots)]
+        return entry if entry is not None and entry.seq == seq else None
+
+    def written(self, seq):
+        """Start the ack clock once the command actually leaves the outbound queue"""
+        entry = self.get(seq)
+        if entry is not None and entry.state == CyncInFlightCommand.QUEUED:
+            entry.state = CyncInFlightCommand.SENT
+            entry.sent_at = time.monotonic()
+
+    def expire(self, seq):
+        entry = self.get(seq)
+        if entry is not None and entry.state != CyncInFlightCommand.ACKED:
+            entry.state = CyncInFlightCommand.EXPIRED
+
+    def acked(self, seq):
+        """Match an ack to the attempt it answers and complete the command, whichever attempt the ack is for"""
+        entry = self.get(seq)
+        if entry is None:
+            self.metrics.acks_unmatched += 1
+            return
+        if entry.state == CyncInFlightCommand.ACKED:
+            self.metrics.acks_duplicate += 1
+            return
+        if entry.state == CyncInFlightCommand.UNTRACKED:
+            entry.state = CyncInFlightCommand.ACKED
+            return
+        if entry.state == CyncInFlightCommand.EXPIRED:
+            self.metrics.acks_late += 1
+        entry.state = CyncInFlightCommand.ACKED
+        self.metrics.command_acked((time.monotonic() - entry.sent_at)*1000)
+        if not entry.command.done():
+            entry.command.set_result(entry.attempt)
+
+    def pending(self):
+        return len([entry for entry in self.slots if entry is not None and entry.state in (CyncInFlightCommand.QUEUED, CyncInFlightCommand.SENT)])
 
 class CyncHub:
 
-    def __init__(self, user_data, options, remove_options_update_listener):
+    def __init__(self, user_data, options, remove_options_update_listener, restored_state=None, transport_factory=CloudTransport):
 
         self.thread = None
         self.loop = None
-        self.reader = None
-        self.writer = None
+        self.ha_loop = None
+        self.transport_factory = transport_factory
+        self._main_task = None
+        self._stopped = Future()
         self.login_code = bytearray(user_data['cync_credentials'])
-        self.logged_in = False
-        self.home_devices = user_data['cync_config']['home_devices']
-        self.home_controllers = user_data['cync_config']['home_controllers']
-        self.switchID_to_homeID = user_data['cync_config']['switchID_to_homeID']
-        self.connected_devices = {home_id:[] for home_id in self.home_controllers.keys()}
+        cync_config = expand_cync_config(user_data['cync_config'])
+        self.home_devices = {home_id:CyncMeshIndex(devices) for home_id, devices in cync_config['home_devices'].items()}
+        self.home_controllers = cync_config['home_controllers']
+        self.switchID_to_homeID = cync_config['switchID_to_homeID']
+        #ordered sets of the Wi-Fi connected devices of each home, in the order they joined
+        self.connected_devices = {home_id:{} for home_id in self.home_controllers.keys()}
         self.shutting_down = False
         self.remove_options_update_listener = remove_options_update_listener
-        self.cync_rooms = {room_id:CyncRoom(room_id,room_info,self) for room_id,room_info in user_data['cync_config']['rooms'].items()}
-        self.cync_switches = {device_id:CyncSwitch(device_id,switch_info,self.cync_rooms.get(switch_info['room'], None),self) for device_id,switch_info in user_data['cync_config']['devices'].items() if switch_info.get("ONOFF",False)}
-        self.cync_motion_sensors = {device_id:CyncMotionSensor(device_id,device_info,self.cync_rooms.get(device_info['room'], None)) for device_id,device_info in user_data['cync_config']['devices'].items() if device_info.get("MOTION",False)}
-        self.cync_ambient_light_sensors = {device_id:CyncAmbientLightSensor(device_id,device_info,self.cync_rooms.get(device_info['room'], None)) for device_id,device_info in user_data['cync_config']['devices'].items() if device_info.get("AMBIENT_LIGHT",False)}
+        self.metrics = CyncHubMetrics()
+        self.cync_rooms = {room_id:CyncRoom(room_id,room_info,self) for room_id,room_info in cync_config['rooms'].items()}
+        self.cync_switches = {device_id:CyncSwitch(device_id,switch_info,self.cync_rooms.get(switch_info['room'], None),self) for device_id,switch_info in cync_config['devices'].items() if switch_info.get("ONOFF",False)}
+        self.cync_motion_sensors = {device_id:CyncMotionSensor(device_id,device_info,self.cync_rooms.get(device_info['room'], None),self) for device_id,device_info in cync_config['devices'].items() if device_info.get("MOTION",False)}
+        self.cync_ambient_light_sensors = {device_id:CyncAmbientLightSensor(device_id,device_info,self.cync_rooms.get(device_info['room'], None),self) for device_id,device_info in cync_config['devices'].items() if device_info.get("AMBIENT_LIGHT",False)}
         self.switchID_to_deviceIDs = {device_info.switch_id:[dev_id for dev_id, dev_info in self.cync_switches.items() if dev_info.switch_id == device_info.switch_id] for device_id, device_info in self.cync_switches.items() if int(device_info.switch_id) > 0}
-        self.connected_devices_updated = False
+        self._controller_views = {home_id:[] for home_id in self.home_controllers.keys()}
+        for device in [*self.cync_rooms.values(), *self.cync_switches.values()]:
+            self._controller_views[device.home_id].append(device.controller_view)
         self.options = options
+        self.heartbeat_interval = options.get("heartbeat_interval", 180)
+        self.keepalive_timeout = 10
+        self.transition_rate = options.get("transition_rate", 5)
+        self.controller_rate_limit = options.get("controller_rate_limit", 10)
+        self.connection_rate_limit = options.get("connection_rate_limit", 50)
+        self._transitions = {}
+        self._transition_buckets = {}
+        self._transition_task = None
+        self.sessions = [CyncSession(self, controllers) for controllers in self._controller_shards()]
+        self.controller_sessions = {int(controller):session for session in self.sessions for controller in session.controllers}
         self._seq_num = 0
-        self.pending_commands = {}
+        self.in_flight = CyncSequenceWindow(self.metrics)
+        #one dict of home waiters per running refresh, so overlapping refreshes are all answered
+        self._state_waiters = []
+        self._recent_pushes = {}
+        self._state_saver = None
+        self._state_dirty = False
+        self._pending_state_writes = {}
+        self._pending_sensor_writes = {}
+        #monotonic and wall clock time of the read being decoded, sensor events are stamped with them
+        self.frames_received_at = None
+        self.frames_received_time = None
         [room.initialize() for room in self.cync_rooms.values() if room.is_subgroup]
         [room.initialize() for room in self.cync_rooms.values() if not room.is_subgroup]
+        if restored_state:
+            self.restore_state(restored_state)
+
+    def _controller_shards(self):
+        """Split the controllers into one group per server session, according to the session mode option"""
+        if self.options.get("session_mode", "single") == "per_home":
+            groups = [[str(controller) for controller in controllers] for controllers in self.home_controllers.values()]
+        else:
+            groups = [[str(controller) for controllers in self.home_controllers.values() for controller in controllers]]
+        shard_size = self.options.get("controllers_per_session", 0)
+        if shard_size > 0:
+            return [group[i:i + shard_size] for group in groups for i in range(0, len(group), shard_size)]
+        return groups
+
+    @property
+    def logged_in(self):
+        return all(session.logged_in for session in self.sessions)
 
     def start_tcp_client(self):
         self.thread = threading.Thread(target=self._start_tcp_client,daemon=True)
@@ -63,263 +511,819 @@ class CyncHub:
     def _start_tcp_client(self):
         self.loop = asyncio.new_event_loop()
         asyncio.set_event_loop(self.loop)
-        self.loop.run_until_complete(self._connect())
+        try:
+            self._main_task = asyncio.gather(*[session.connect() for session in self.sessions])
+            self.loop.run_until_complete(self._main_task)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            #cancel whatever is left, transitions and commands submitted from Home Assistant
+            remaining = asyncio.all_tasks(self.loop)
+            for task in remaining:
+                task.cancel()
+            if remaining:
+                self.loop.run_until_complete(asyncio.gather(*remaining, return_exceptions=True))
+            self.loop.close()
+            self._stopped.set_result(True)
 
     def disconnect(self):
+        """Stop the hub without waiting, the connections are closed and the hub tasks cancelled on the hub loop"""
         self.shutting_down = True
-        for home_controllers in self.home_controllers.values(): #send packets to server to generate data to be read which will initiate shutdown
-            for controller in home_controllers:
-                seq = self.get_seq_num()
-                state_request = bytes.fromhex('7300000018') + int(controller).to_bytes(4,'big') + seq.to_bytes(2,'big') + bytes.fromhex('007e00000000f85206000000ffff0000567e')
-                self.loop.call_soon_threadsafe(self.send_request,state_request)
-
-    async def _connect(self):
-        while not self.shutting_down:
+        if self.loop is not None and not self.loop.is_closed():
             try:
-                context = ssl.create_default_context()
-                try:
-                    self.reader, self.writer = await asyncio.open_connection('cm.gelighting.com', 23779, ssl = context)
-                except Exception as e:
-                    context.check_hostname = False
-                    context.verify_mode = ssl.CERT_NONE
-                    try:
-                        self.reader, self.writer = await asyncio.open_connection('cm.gelighting.com', 23779, ssl = context)
-                    except Exception as e:
-                        self.reader, self.writer = await asyncio.open_connection('cm.gelighting.com', 23778)
+                self.loop.call_soon_threadsafe(self._shutdown)
+            except RuntimeError:
+                #the loop closed in the meantime
+                pass
+
+    async def async_disconnect(self, timeout=SHUTDOWN_TIMEOUT):
+        """Stop the hub and wait until its thread has finished, so a reload never overlaps with the old connections"""
+        self.disconnect()
+        if self.thread is None:
+            return True
+        try:
+            await asyncio.wait_for(asyncio.wrap_future(self._stopped), timeout)
+        except asyncio.TimeoutError:
+            _LOGGER.warning("Cync hub did not stop within %s seconds", timeout)
+            return False
+        return True
+
+    def _shutdown(self):
+        for session in self.sessions:
+            session.close()
+        if self._main_task is not None:
+            self._main_task.cancel()
+
+    def queue_state_write(self, device, sensor=False):
+        """
+        Mark a room, switch or sensor as changed. The changes made while handling the current packets
+        are handed to the Home Assistant loop together, once the hub loop is next idle, with sensors first.
+        """
+        pending = self._pending_sensor_writes if sensor else self._pending_state_writes
+        if self.loop is None or not self.loop.is_running():
+            pending[device] = None
+            self._flush_state_writes()
+            return
+        if len(self._pending_state_writes) == 0 and len(self._pending_sensor_writes) == 0:
+            self.loop.call_soon(self._flush_state_writes)
+        pending[device] = None
+
+    def _flush_state_writes(self):
+        devices = list(self._pending_sensor_writes) + list(self._pending_state_writes)
+        self._pending_sensor_writes.clear()
+        self._pending_state_writes.clear()
+        if len(devices) == 0:
+            return
+        self.metrics.state_write_batches += 1
+        self.metrics.state_writes += len(devices)
+        if self.ha_loop is not None:
+            self.ha_loop.call_soon_threadsafe(_write_states, devices, self.metrics)
+        else:
+            _write_states(devices, self.metrics)
+
+    def set_state_saver(self, state_saver):
+        """Register a callback asking for the state snapshot to be saved, it is called once each time the state becomes dirty"""
+        self._state_saver = state_saver
+
+    def state_changed(self):
+        if not self._state_dirty:
+            self._state_dirty = True
+            if self._state_saver is not None:
+                self._state_saver()
+
+    def state_snapshot(self):
+        """Return the last known device state and connected controllers, to be restored when the hub is next created"""
+        self._state_dirty = False
+        return {
+            'switches':{device_id:[switch.power_state, switch.brightness, switch.color_temp, switch.rgb['r'], switch.rgb['g'], switch.rgb['b'], switch.rgb['active']] for device_id, switch in self.cync_switches.items()},
+            'connected_devices':{home_id:list(devices) for home_id, devices in self.connected_devices.items()},
+        }
+
+    def restore_state(self, snapshot):
+        """Restore a state snapshot so entities start with their last known state, live updates overwrite it as they arrive"""
+        for device_id, (state, brightness, color_temp, r, g, b, active) in snapshot.get('switches', {}).items():
+            if device_id in self.cync_switches:
+                self.cync_switches[device_id].update_switch(state, brightness, color_temp, {'r':r, 'g':g, 'b':b, 'active':active})
+        for home_id, devices in snapshot.get('connected_devices', {}).items():
+            if home_id in self.connected_devices:
+                self.connected_devices[home_id] = {device_id:None for device_id in devices if device_id in self.cync_switches}
+        for dev in self.cync_switches.values():
+            dev.update_controllers()
+        for room in self.cync_rooms.values():
+            room.update_controllers()
+        self._state_dirty = False
+
+    def _handle_packet(self, session, packet_type, packet, packet_length):
+        """Decode a single packet received on one of the server sessions"""
+        if packet_type == 115:
+            switch_id = str(struct.unpack(">I", packet[0:4])[0])
+            home_id = self.switchID_to_homeID[switch_id]
+
+            #send response packet
+            session.queue_ack(switch_id, packet[4:6])
+
+            if switch_id not in session.controllers:
+                #another session owns this controller and decodes its copy of the packet
+                return
+            if self._handle_device_change(switch_id, home_id, packet, packet_length):
+                return
+            if packet_length > 51 and int(packet[13]) == 82:
+                #parse initial state packet
+                self._add_connected_devices(session, switch_id, home_id)
+                self._state_reported(switch_id, home_id, packet, packet_length)
+                self._update_from_records(home_id, STATE_DUMP_RECORD, packet, 22, packet_length - 24)
+        elif packet_type == 131:
+            switch_id = str(struct.unpack(">I", packet[0:4])[0])
+            if switch_id not in session.controllers:
+                return
+            home_id = self.switchID_to_homeID[switch_id]
+            self._handle_device_change(switch_id, home_id, packet, packet_length)
+        elif packet_type == 67 and packet_length >= 26 and int(packet[4]) == 1 and int(packet[5]) == 1 and int(packet[6]) == 6:
+            #parse state packet
+            switch_id = str(struct.unpack(">I", packet[0:4])[0])
+            if switch_id not in session.controllers:
+                return
+            home_id = self.switchID_to_homeID[switch_id]
+            self._update_from_records(home_id, STATE_PACKET_RECORD, packet, 7, packet_length - 18)
+        elif packet_type == 171:
+            switch_id = str(struct.unpack(">I", packet[0:4])[0])
+            if switch_id in session.controllers:
+                home_id = self.switchID_to_homeID[switch_id]
+                self._add_connected_devices(session, switch_id, home_id)
+        elif packet_type == 216:
+            if session._keepalive_sent_at is not None:
+                self.metrics.keepalive_rtt = (time.monotonic() - session._keepalive_sent_at)*1000
+        elif packet_type == 123:
+            self.in_flight.acked(struct.unpack(">H", packet[4:6])[0])
+
+    def _handle_device_change(self, switch_id, home_id, packet, packet_length):
+        """
+        Decode a single device change carried by a 0x73 push or a 0x83 broadcast, returning False if the packet is not one.
+        The cloud often sends the same change down both paths, so a repeat of the last change seen for a device
+        within PUSH_DEDUP_TTL is dropped before any model work. A switch changed any other way forgets its last push,
+        see forget_push, so a change back to a recently pushed value is never dropped.
+        """
+        if packet_length >= 33 and int(packet[13]) == 219:
+            key = (219, self.home_devices[home_id].device(int(packet[21])))
+            payload = packet[27:29]
+        elif packet_length >= 25 and int(packet[13]) == 84:
+            key = (84, self.home_devices[home_id].device(int(packet[16])))
+            payload = packet[22:25]
+        else:
+            return False
+        now = time.monotonic()
+        recent = self._recent_pushes.get(key)
+        if recent is not None and recent[0] == payload and recent[1] > now:
+            self.metrics.pushes_deduplicated += 1
+            return True
+        deviceID = key[1]
+        if key[0] == 219:
+            #parse state and brightness change packet
+            state = int(packet[27]) > 0
+            brightness = int(packet[28]) if state else 0
+            if deviceID in self.cync_switches:
+                self.cync_switches[deviceID].update_switch(state,brightness,self.cync_switches[deviceID].color_temp,self.cync_switches[deviceID].rgb)
+        else:
+            #parse motion and ambient light sensor packet
+            motion = int(packet[22]) > 0
+            ambient_light = int(packet[24]) > 0
+            if deviceID in self.cync_motion_sensors:
+                self.cync_motion_sensors[deviceID].update_motion_sensor(motion)
+            if deviceID in self.cync_ambient_light_sensors:
+                self.cync_ambient_light_sensors[deviceID].update_ambient_light_sensor(ambient_light)
+        #recorded after the update, which made the switch forget its previous push
+        self._recent_pushes[key] = (payload, now + PUSH_DEDUP_TTL)
+        return True
+
+    def forget_push(self, device_id):
+        """Forget the last push seen for a switch, called whenever the state of the switch changes"""
+        self._recent_pushes.pop((219, device_id), None)
+
+    def _update_from_records(self, home_id, record, packet, start, stop):
+        """Update the switches from the fixed size state records found at offsets start, start + record.size, ... below stop"""
+        devices = self.home_devices[home_id].devices
+        cync_switches = self.cync_switches
+        view = memoryview(packet)
+        for offset in range(start, stop, record.size):
+            index, state, brightness, color_temp, r, g, b = record.unpack_from(view, offset)
+            switch = cync_switches.get(devices.get(index))
+            if switch is None:
+                continue
+            if switch.elements > 1:
+                #the element states are the bits of the brightness byte
+                for i, device_id in enumerate(switch.element_device_ids):
+                    element = cync_switches[device_id]
+                    element_state = ((brightness >> i) & state) > 0
+                    element.update_switch(element_state, 100 if element_state else 0, element.color_temp, element.rgb)
+            else:
+                switch.update_switch(state > 0, brightness if state > 0 else 0, color_temp, {'r':r, 'g':g, 'b':b, 'active':color_temp == 254})
+
+    def _state_reported(self, switch_id, home_id, packet, packet_length):
+        """Pass a chunk of a 0x52 dump to the refreshes waiting on the controller that sent it"""
+        if len(self._state_waiters) == 0:
+            return
+        #the mesh index is the first byte of every record
+        indexes = packet[22:packet_length - 24:STATE_DUMP_RECORD.size]
+        now = time.monotonic()
+        for waiters in self._state_waiters:
+            request = waiters.get(home_id)
+            if request is not None and request.controller == switch_id and not request.answered.done():
+                request.received(indexes, now)
+
+    def state_request(self, controller):
+        """Build a request for the state of every device in the controller's home"""
+        seq = self.get_untracked_seq_num()
+        return bytes.fromhex('7300000018') + int(controller).to_bytes(4,'big') + seq.to_bytes(2,'big') + bytes.fromhex('007e00000000f85206000000ffff0000567e')
+
+    async def async_refresh_state(self, timeout=10):
+        """Request the state of every home at once and wait until the requested controller of each one has sent its full dump or timeout expires"""
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._refresh_state(timeout), self.loop))
+
+    async def _refresh_state(self, timeout):
+        start = time.monotonic()
+        waiters = {}
+        for session in self.sessions:
+            for home_id in session.home_controllers:
+                if home_id not in waiters:
+                    controller = session.state_controller(home_id)
+                    #a dump record holds a one byte mesh index, so element devices never appear in it
+                    waiters[home_id] = CyncStateRequest(controller, [index for index in self.home_devices[home_id].devices if index < 256], self.loop)
+                    session.send_request(self.state_request(controller), PRIORITY_STATE)
+        self._state_waiters.append(waiters)
+        try:
+            await asyncio.wait([request.answered for request in waiters.values()], timeout=timeout)
+        finally:
+            self._state_waiters.remove(waiters)
+            for request in waiters.values():
+                request.cancel()
+        return {
+            'duration':round(time.monotonic() - start, 3),
+            'homes':{home_id:round(request.answered.result() - start, 3) if request.answered.done() else None for home_id, request in waiters.items()},
+            'complete':all(request.answered.done() for request in waiters.values()),
+        }
+
+    def request_keepalive(self, controller):
+        """Send a heartbeat on the session carrying controller, to check that connection is still alive"""
+        self.controller_sessions.get(int(controller), self.sessions[0]).request_keepalive()
+
+    def _add_connected_devices(self, session, switch_id, home_id):
+        connected_devices = self.connected_devices[home_id]
+        for device_id in self.switchID_to_deviceIDs[switch_id]:
+            #update the set of WiFi connected devices
+            if device_id not in connected_devices:
+                connected_devices[device_id] = None
+                if session.connected_devices_updated:
+                    #a device joining after discovery only adds one entry to the views of its own home
+                    for view in self._controller_views[home_id]:
+                        view.joined(device_id, switch_id)
+
+    async def _async_run_in_hub(self, func):
+        """Run func on the hub event loop and return its result to the calling event loop"""
+        async def run():
+            return func()
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(run(), self.loop))
+
+    async def async_measure_loop_lag(self, timeout=LOOP_LAG_TIMEOUT):
+        """Return the time in ms it takes the hub event loop to pick up a callback, 'timeout' if it takes over timeout seconds"""
+        if self.loop is None or not self.loop.is_running():
+            return None
+        start = time.monotonic()
+        try:
+            picked_up = await asyncio.wait_for(self._async_run_in_hub(time.monotonic), timeout)
+        except asyncio.TimeoutError:
+            _LOGGER.warning("Cync hub event loop did not pick up a callback within %s seconds", timeout)
+            return 'timeout'
+        return round((picked_up - start)*1000, 2)
+
+    async def async_profile(self, duration, trace_memory=False):
+        """Sample the stack of the hub thread for duration seconds, optionally with a tracemalloc snapshot of hub allocations"""
+        #before start_tcp_client there is no hub thread, the sampler then finds no stack and takes no samples
+        profiler = CyncStackSampler(self.thread.ident if self.thread is not None else None)
+        started_tracing = trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        profiler.start()
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            profiler.stop()
+        snapshot = None
+        if trace_memory:
+            snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(True, __file__)])
+            if started_tracing:
+                tracemalloc.stop()
+        return profiler, snapshot
+
+    def runtime_snapshot(self):
+        """Return a snapshot of connection and performance state for diagnostics"""
+        return {
+            'logged_in':self.logged_in,
+            'sessions':[session.snapshot() for session in self.sessions],
+            'connected_devices':{home_id:len(devices) for home_id,devices in self.connected_devices.items()},
+            'pending_commands':self.in_flight.pending(),
+            'metrics':self.metrics.as_dict(),
+        }
+
+    def send_request(self,request,priority=PRIORITY_CONTROL):
+        """Route a request to the session carrying the controller it is addressed to"""
+        controller = int.from_bytes(request[5:9],'big')
+        self.controller_sessions.get(controller, self.sessions[0]).send_request(request, priority, controller)
+
+    async def send_command(self, device, send, stop_transition=True):
+        """
+        Send a command through the device's controllers, retrying until the Cync server acknowledges it, see _send_command.
+        A fade still running on the device is stopped first, unless the command is the final value of that fade.
+        """
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._send_command(device, send, stop_transition), self.loop))
+
+    async def _send_command(self, device, send, stop_transition=True):
+        """
+        Retry loop of send_command. It runs on the hub loop, where the sequence window and the acks are handled,
+        so an ack completes the command future without crossing threads.
+        """
+        if stop_transition:
+            self._stop_transition(device)
+        #completed by the ack of any attempt, so a late ack for an earlier attempt ends the retries
+        command = self.loop.create_future()
+        attempts = 0
+        while attempts < int(device._command_retry_time/device._command_timout):
+            seq = self.get_seq_num()
+            if len(device.controllers) > 0:
+                controller = device.controllers[attempts%len(device.controllers)]
+            else:
+                controller = device.default_controller
+            entry = self.in_flight.open(seq, command, attempts, controller)
+            send(controller, seq)
+            self.metrics.command_sent(attempts)
+            await asyncio.wait([command], timeout=device._command_timout)
+            waited = device._command_timout
+            while not command.done() and entry.state == CyncInFlightCommand.QUEUED and waited < device._command_retry_time:
+                #still queued behind the rate limiter, the ack timeout starts once it is written
+                await asyncio.wait([command], timeout=device._command_timout)
+                waited += device._command_timout
+            if command.done():
+                #an earlier attempt may have been acked, this one is no longer waited for
+                self.in_flight.expire(seq)
+                return True
+            self.in_flight.expire(seq)
+            self.metrics.commands_timed_out += 1
+            if attempts == 0:
+                self.request_keepalive(controller)
+            attempts += 1
+        return False
+
+    async def async_apply_scene(self, targets, timeout=5):
+        """Apply a list of (device, target) pairs together, see _apply_scene"""
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._apply_scene(targets, timeout), self.loop))
+
+    async def _apply_scene(self, targets, timeout):
+        """
+        Encode the command for every target up front and send them in one burst, spread over the available controllers.
+        The acks are awaited together and only the commands that were not acknowledged are sent again, until every
+        command is confirmed or timeout expires. A target is a dict with state and optionally brightness, rgb_color
+        and color_temp_kelvin.
+        """
+        start = time.monotonic()
+        commands = []
+        for device, target in targets:
+            self._stop_transition(device)
+            if target.get('state', True):
+                send = device.on_command(target.get('rgb_color'), target.get('brightness'), target.get('color_temp_kelvin'))
+            else:
+                send = device.off_command()
+            commands.append({'device':device, 'send':send, 'done':self.loop.create_future(), 'seq':None})
+        attempt = 0
+        stragglers = commands
+        while len(stragglers) > 0 and time.monotonic() - start < timeout:
+            load = {}
+            entries = []
+            for command in stragglers:
+                device = command['device']
+                candidates = device.controllers if len(device.controllers) > 0 else [device.default_controller]
+                #rotate through the device's controllers on retries, preferring the least used in this burst
+                candidates = candidates[attempt%len(candidates):] + candidates[:attempt%len(candidates)]
+                controller = min(candidates, key = lambda controller: load.get(controller, 0))
+                load[controller] = load.get(controller, 0) + 1
+                command['seq'] = self.get_seq_num()
+                entries.append(self.in_flight.open(command['seq'], command['done'], attempt, controller))
+                command['send'](controller, command['seq'])
+                self.metrics.command_sent(attempt)
+            command_timeout = max(command['device']._command_timout for command in stragglers)
+            pending = [command['done'] for command in stragglers]
+            await asyncio.wait(pending, timeout=command_timeout)
+            while True in [entry.state == CyncInFlightCommand.QUEUED for entry in entries] and False in [done.done() for done in pending] and time.monotonic() - start < timeout:
+                #part of the burst is still queued behind the rate limiter
+                await asyncio.wait(pending, timeout=command_timeout)
+            for command in stragglers:
+                self.in_flight.expire(command['seq'])
+                if not command['done'].done():
+                    self.metrics.commands_timed_out += 1
+            stragglers = [command for command in stragglers if not command['done'].done()]
+            attempt += 1
+        return {
+            'duration':round(time.monotonic() - start, 3),
+            'confirmed':len(commands) - len(stragglers),
+            'failed':[command['device'].name for command in stragglers],
+            'attempts':attempt,
+        }
+
+    def combo_control(self,state,brightness,color_tone,rgb,switch_id,mesh_id,seq):
+        combo_request = bytes.fromhex('7300000022') + int(switch_id).to_bytes(4,'big') + int(seq).to_bytes(2,'big') + bytes.fromhex('007e00000000f8f010000000000000') + mesh_id + bytes.fromhex('f00000') + (1 if state else 0).to_bytes(1,'big')  + brightness.to_bytes(1,'big') + color_tone.to_bytes(1,'big') + rgb[0].to_bytes(1,'big') + rgb[1].to_bytes(1,'big') + rgb[2].to_bytes(1,'big') + ((496 + int(mesh_id[0]) + int(mesh_id[1]) + (1 if state else 0) + brightness + color_tone + sum(rgb))%256).to_bytes(1,'big') + bytes.fromhex('7e')
+        self.loop.call_soon_threadsafe(self.send_request,combo_request)
+
+    def turn_on(self,switch_id,mesh_id,seq):
+        power_request = bytes.fromhex('730000001f') + int(switch_id).to_bytes(4,'big') + int(seq).to_bytes(2,'big') + bytes.fromhex('007e00000000f8d00d000000000000') + mesh_id + bytes.fromhex('d00000010000') + ((430 + int(mesh_id[0]) + int(mesh_id[1]))%256).to_bytes(1,'big') + bytes.fromhex('7e')
+        self.loop.call_soon_threadsafe(self.send_request,power_request)
+
+    def turn_off(self,switch_id,mesh_id,seq):
+        power_request = bytes.fromhex('730000001f') + int(switch_id).to_bytes(4,'big') + int(seq).to_bytes(2,'big') + bytes.fromhex('007e00000000f8d00d000000000000') + mesh_id + bytes.fromhex('d00000000000') + ((429 + int(mesh_id[0]) + int(mesh_id[1]))%256).to_bytes(1,'big') + bytes.fromhex('7e')
+        self.loop.call_soon_threadsafe(self.send_request,power_request)
+
+    def set_color_temp(self,color_temp,switch_id,mesh_id,seq):
+        color_temp_request = bytes.fromhex('730000001e') + int(switch_id).to_bytes(4,'big') + int(seq).to_bytes(2,'big') + bytes.fromhex('007e00000000f8e20c000000000000') + mesh_id + bytes.fromhex('e2000005') + color_temp.to_bytes(1,'big') + ((469 + int(mesh_id[0]) + int(mesh_id[1]) + color_temp)%256).to_bytes(1,'big') + bytes.fromhex('7e')
+        self.loop.call_soon_threadsafe(self.send_request,color_temp_request)
+
+    async def transition(self, device, attr_rgb, attr_br, attr_ct, duration):
+        """Fade a switch or room towards the requested values over duration seconds
+
+        Intermediate steps are sent without waiting for acknowledgement, at no more than
+        transition_rate steps per second for each controller. Returns False if a newer
+        transition took over the device, otherwise the caller sends the final value as a
+        normal acknowledged command."""
+        start = (device.brightness if device.power_state else 0, device.color_temp, device.rgb['r'], device.rgb['g'], device.rgb['b'])
+        if attr_rgb is not None:
+            mode = 'rgb'
+            target = (start[0], start[1], *attr_rgb)
+        elif attr_ct is not None:
+            mode = 'color_temp'
+            color_temp = round(100*((attr_ct - device.min_color_temp_kelvin)/(device.max_color_temp_kelvin - device.min_color_temp_kelvin)))
+            if device.rgb['active'] or not 0 <= start[1] <= 100:
+                #color_temp is 254 in RGB mode and rooms average it over their lights, so there is no temperature
+                #to fade from, the temperature jumps to the target and only the brightness fades
+                start = (start[0], color_temp, *start[2:])
+            target = (start[0], color_temp, *start[2:])
+        else:
+            mode = 'brightness'
+            target = start
+        if attr_br is not None:
+            target = (round(attr_br*100/255), *target[1:])
+        elif start[0] == 0:
+            target = (100, *target[1:])
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._transition(device, mode, start, target, duration), self.loop))
+
+    def _stop_transition(self, device):
+        """Stop the transition running on device, its caller then skips the final command"""
+        transition = self._transitions.pop(device, None)
+        if transition is not None and not transition['finished'].done():
+            transition['finished'].set_result(False)
+
+    async def _transition(self, device, mode, start, target, duration):
+        #a newer transition for the same device replaces this one
+        self._stop_transition(device)
+        if target == start:
+            return True
+        finished = self.loop.create_future()
+        self._transitions[device] = {'mode':mode, 'start':start, 'target':target, 'started':time.monotonic(), 'duration':duration, 'last':start, 'finished':finished}
+        if self._transition_task is None:
+            self._transition_task = self.loop.create_task(self._run_transitions())
+        return await finished
+
+    async def _run_transitions(self):
+        """Send the current interpolated value of every active transition, one tick at a time"""
+        #the burst lets rates above one step per tick through, the bucket keeps the average at transition_rate
+        burst = max(1, math.ceil(self.transition_rate*TRANSITION_TICK))
+        try:
+            while self._transitions:
+                now = time.monotonic()
+                stepped = []
+                for device, transition in list(self._transitions.items()):
+                    fraction = (now - transition['started'])/transition['duration']
+                    if fraction >= 1:
+                        self._transitions.pop(device)
+                        if not transition['finished'].done():
+                            transition['finished'].set_result(True)
+                        continue
+                    controller = device.controllers[0] if len(device.controllers) > 0 else device.default_controller
+                    bucket = self._transition_buckets.get(controller)
+                    if bucket is None:
+                        bucket = self._transition_buckets[controller] = CyncTokenBucket(self.transition_rate, burst)
+                    if bucket.delay(now) > 0:
+                        #this controller is at its step rate, the transition catches up on a later tick
+                        continue
+                    values = tuple(round(begin + (end - begin)*fraction) for begin, end in zip(transition['start'], transition['target']))
+                    if values == transition['last']:
+                        continue
+                    transition['last'] = values
+                    bucket.consume()
+                    stepped.append(device)
+                    brightness, color_temp, r, g, b = values
+                    seq = self.get_untracked_seq_num()
+                    if transition['mode'] == 'rgb':
+                        self.combo_control(True, brightness, 254, [r, g, b], controller, device.mesh_id, seq)
+                    elif transition['mode'] == 'color_temp':
+                        self.combo_control(True, brightness, color_temp, [255,255,255], controller, device.mesh_id, seq)
+                    else:
+                        self.combo_control(True, brightness, 255, [255,255,255], controller, device.mesh_id, seq)
+                    self.metrics.transition_steps += 1
+                for device in stepped:
+                    #round robin, devices that just stepped go to the back of the queue
+                    if device in self._transitions:
+                        self._transitions[device] = self._transitions.pop(device)
+                await asyncio.sleep(TRANSITION_TICK)
+        finally:
+            self._transition_task = None
+
+    def get_seq_num(self):
+        if self._seq_num == 65535:
+            self._seq_num = 1
+        else:
+            self._seq_num += 1
+        return self._seq_num
+
+    def get_untracked_seq_num(self):
+        """Return a sequence number for a request whose ack nobody waits for, the ack is still recognised when it comes"""
+        seq = self.get_seq_num()
+        self.in_flight.open_untracked(seq)
+        return seq
+
+class CyncSession:
+    """A connection to the Cync server carrying the traffic for one shard of controllers
+
+    Every session receives the pushes for the whole account, so a session only decodes
+    packets from its own controllers and leaves the rest to the session that owns them."""
+
+    def __init__(self, hub, controllers):
+
+        self.hub = hub
+        self.controllers = set(controllers)
+        self.home_controllers = {home_id:[controller for controller in home_controllers if str(controller) in self.controllers] for home_id, home_controllers in hub.home_controllers.items()}
+        self.home_controllers = {home_id:home_controllers for home_id, home_controllers in self.home_controllers.items() if len(home_controllers) > 0}
+        self.transport = None
+        self.logged_in = False
+        self.connected_devices_updated = False
+        self._keepalive_probe = None
+        self._keepalive_sent_at = None
+        self._login_complete = None
+        self.outbound = [deque() for _ in PRIORITY_NAMES]
+        self._ack_templates = {}
+        self._tasks = []
+        self._pending_acks = bytearray()
+        self._outbound_ready = asyncio.Event()
+        self.connection_bucket = CyncTokenBucket(hub.connection_rate_limit, hub.connection_rate_limit)
+        self.controller_buckets = {int(controller):CyncTokenBucket(hub.controller_rate_limit, hub.controller_rate_limit) for controller in self.controllers}
+
+    async def connect(self):
+        connected_before = False
+        while not self.hub.shutting_down:
+            try:
+                self.transport = self.hub.transport_factory(self.hub.metrics)
+                await self.transport.open()
             except Exception as e:
                 _LOGGER.error(e)
                 await asyncio.sleep(5)
             else:
+                if connected_before:
+                    self.hub.metrics.reconnects += 1
+                connected_before = True
+                self._keepalive_probe = asyncio.Event()
+                self._keepalive_sent_at = None
+                self._login_complete = asyncio.Event()
                 read_tcp_messages = asyncio.create_task(self._read_tcp_messages(), name = "Read TCP Messages")
+                write_requests = asyncio.create_task(self._write_requests(), name = "Write Requests")
                 maintain_connection = asyncio.create_task(self._maintain_connection(), name = "Maintain Connection")
                 update_state = asyncio.create_task(self._update_state(), name = "Update State")
                 update_connected_devices = asyncio.create_task(self._update_connected_devices(), name = "Update Connected Devices")
-                read_write_tasks = [read_tcp_messages, maintain_connection, update_state, update_connected_devices]
+                read_write_tasks = [read_tcp_messages, write_requests, maintain_connection, update_state, update_connected_devices]
+                self._tasks = read_write_tasks
                 try:
                     done, pending = await asyncio.wait(read_write_tasks,return_when=asyncio.FIRST_EXCEPTION)
+                    stale = False
                     for task in done:
                         name = task.get_name()
                         exception = task.exception()
+                        if isinstance(exception, StaleConnection):
+                            stale = True
                         try:
                             result = task.result()
                         except Exception as e:
                             _LOGGER.error(e)
                     for task in pending:
                         task.cancel()
-                    if not self.shutting_down:
+                    self.logged_in = False
+                    self.transport.close()
+                    if self.hub.shutting_down:
+                        _LOGGER.info("Cync client shutting down")
+                    elif stale:
+                        self.hub.metrics.stale_connections += 1
+                        _LOGGER.info("Connection to Cync server is stale, reconnecting")
+                        await asyncio.sleep(1)
+                    else:
                         _LOGGER.info("Connection to Cync server reset, restarting in 15 seconds")
                         await asyncio.sleep(15)
-                    else:
-                        _LOGGER.info("Cync client shutting down")
                 except Exception as e:
                     _LOGGER.error(e)
 
     async def _read_tcp_messages(self):
-        self.writer.write(self.login_code)
-        await self.writer.drain()
-        await self.reader.read(1000)
+        self.transport.write(self.hub.login_code)
+        await self.transport.drain()
+        await self.transport.read(1000)
         self.logged_in = True
-        while not self.shutting_down:
-            data = await self.reader.read(1000)
-            if len(data) == 0:
+        self._login_complete.set()
+        metrics = self.hub.metrics
+        while not self.hub.shutting_down:
+            try:
+                #idle watchdog, a heartbeat is answered well within this time on a live connection
+                frames = await asyncio.wait_for(self.transport.read_frames(), self.hub.heartbeat_interval + self.hub.keepalive_timeout)
+            except asyncio.TimeoutError:
+                raise StaleConnection
+            if frames is None:
                 self.logged_in = False
                 raise LostConnection
-            while len(data) >= 12:
-                packet_type = int(data[0])
-                packet_length = struct.unpack(">I", data[1:5])[0]
-                packet = data[5:packet_length+5]
+            self.hub.frames_received_at = time.monotonic()
+            self.hub.frames_received_time = time.time()
+            if len(frames) > 1:
+                #motion and ambient light changes usually trigger automations, so they are handled first
+                frames.sort(key = lambda frame: not _is_sensor_frame(frame))
+            for packet_type, packet, packet_length in frames:
                 try:
-                    if packet_length == len(packet):
-                        if packet_type == 115:
-                            switch_id = str(struct.unpack(">I", packet[0:4])[0])
-                            home_id = self.switchID_to_homeID[switch_id]
-
-                            #send response packet
-                            response_id = struct.unpack(">H", packet[4:6])[0]
-                            response_packet = bytes.fromhex('7300000007') + int(switch_id).to_bytes(4,'big') + response_id.to_bytes(2,'big') + bytes.fromhex('00')
-                            self.loop.call_soon_threadsafe(self.send_request, response_packet)
-
-                            if packet_length >= 33 and int(packet[13]) == 219:
-                                #parse state and brightness change packet
-                                deviceID = self.home_devices[home_id][int(packet[21])]
-                                state = int(packet[27]) > 0
-                                brightness = int(packet[28]) if state else 0
-                                if deviceID in self.cync_switches:
-                                    self.cync_switches[deviceID].update_switch(state,brightness,self.cync_switches[deviceID].color_temp,self.cync_switches[deviceID].rgb)
-                            elif packet_length >= 25 and int(packet[13]) == 84:
-                                #parse motion and ambient light sensor packet
-                                deviceID = self.home_devices[home_id][int(packet[16])]
-                                motion = int(packet[22]) > 0
-                                ambient_light = int(packet[24]) > 0
-                                if deviceID in self.cync_motion_sensors:
-                                    self.cync_motion_sensors[deviceID].update_motion_sensor(motion)
-                                if deviceID in self.cync_ambient_light_sensors:
-                                    self.cync_ambient_light_sensors[deviceID].update_ambient_light_sensor(ambient_light)
-                            elif packet_length > 51 and int(packet[13]) == 82:
-                                #parse initial state packet
-                                switch_id = str(struct.unpack(">I", packet[0:4])[0])
-                                home_id = self.switchID_to_homeID[switch_id]
-                                self._add_connected_devices(switch_id, home_id)
-                                packet = packet[22:]
-                                while len(packet) > 24:
-                                    deviceID = self.home_devices[home_id][int(packet[0])]
-                                    if deviceID in self.cync_switches:
-                                        if self.cync_switches[deviceID].elements > 1:
-                                            for i in range(self.cync_switches[deviceID].elements):
-                                                device_id = self.home_devices[home_id][(i+1)*256 + int(packet[0])]
-                                                state = int((int(packet[12]) >> i) & int(packet[8])) > 0
-                                                brightness = 100 if state else 0
-                                                self.cync_switches[device_id].update_switch(state,brightness,self.cync_switches[device_id].color_temp,self.cync_switches[device_id].rgb)
-                                        else:
-                                            state = int(packet[8]) > 0
-                                            brightness = int(packet[12]) if state else 0
-                                            color_temp = int(packet[16])
-                                            rgb = {'r':int(packet[20]),'g':int(packet[21]),'b':int(packet[22]),'active':int(packet[16])==254}
-                                            self.cync_switches[deviceID].update_switch(state,brightness,color_temp,rgb)
-                                    packet = packet[24:]
-                        elif packet_type == 131:
-                            switch_id = str(struct.unpack(">I", packet[0:4])[0])
-                            home_id = self.switchID_to_homeID[switch_id]
-                            if packet_length >= 33 and int(packet[13]) == 219:
-                                #parse state and brightness change packet
-                                deviceID = self.home_devices[home_id][int(packet[21])]
-                                state = int(packet[27]) > 0
-                                brightness = int(packet[28]) if state else 0
-                                if deviceID in self.cync_switches:
-                                    self.cync_switches[deviceID].update_switch(state,brightness,self.cync_switches[deviceID].color_temp,self.cync_switches[deviceID].rgb)
-                            elif packet_length >= 25 and int(packet[13]) == 84:
-                                #parse motion and ambient light sensor packet
-                                deviceID = self.home_devices[home_id][int(packet[16])]
-                                motion = int(packet[22]) > 0
-                                ambient_light = int(packet[24]) > 0
-                                if deviceID in self.cync_motion_sensors:
-                                    self.cync_motion_sensors[deviceID].update_motion_sensor(motion)
-                                if deviceID in self.cync_ambient_light_sensors:
-                                    self.cync_ambient_light_sensors[deviceID].update_ambient_light_sensor(ambient_light)
-                        elif packet_type == 67 and packet_length >= 26 and int(packet[4]) == 1 and int(packet[5]) == 1 and int(packet[6]) == 6:
-                            #parse state packet
-                            switch_id = str(struct.unpack(">I", packet[0:4])[0])
-                            home_id = self.switchID_to_homeID[switch_id]
-                            packet = packet[7:]
-                            while len(packet) >= 19:
-                                if int(packet[3]) < len(self.home_devices[home_id]):
-                                    deviceID = self.home_devices[home_id][int(packet[3])]
-                                    if deviceID in self.cync_switches:
-                                        if self.cync_switches[deviceID].elements > 1:
-                                            for i in range(self.cync_switches[deviceID].elements):
-                                                device_id = self.home_devices[home_id][(i+1)*256 + int(packet[3])]
-                                                state = int((int(packet[5]) >> i) & int(packet[4])) > 0
-                                                brightness = 100 if state else 0
-                                                self.cync_switches[device_id].update_switch(state,brightness,self.cync_switches[device_id].color_temp,self.cync_switches[device_id].rgb)
-                                        else:
-                                            state = int(packet[4]) > 0
-                                            brightness = int(packet[5]) if state else 0
-                                            color_temp = int(packet[6])
-                                            rgb = {'r':int(packet[7]),'g':int(packet[8]),'b':int(packet[9]),'active':int(packet[6])==254}
-                                            self.cync_switches[deviceID].update_switch(state,brightness,color_temp,rgb)
-                                packet = packet[19:]
-                        elif packet_type == 171:
-                            switch_id = str(struct.unpack(">I", packet[0:4])[0])
-                            home_id = self.switchID_to_homeID[switch_id]
-                            self._add_connected_devices(switch_id, home_id)
-                        elif packet_type == 123:
-                            seq = str(struct.unpack(">H", packet[4:6])[0])
-                            command_received = self.pending_commands.get(seq,None)
-                            if command_received is not None:
-                                command_received(seq)
+                    metrics.frames_received[packet_type] += 1
+                    self.hub._handle_packet(self, packet_type, packet, packet_length)
                 except Exception as e:
+                    metrics.decode_errors += 1
                     _LOGGER.error(e)
-                data = data[packet_length+5:]
+            self.flush_acks()
         raise ShuttingDown
 
-
     async def _maintain_connection(self):
-        while not self.shutting_down:
-            await asyncio.sleep(180)
-            self.writer.write(bytes.fromhex('d300000000'))
-            await self.writer.drain()
+        while not self.hub.shutting_down:
+            try:
+                await asyncio.wait_for(self._keepalive_probe.wait(), self.hub.heartbeat_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._keepalive_probe.clear()
+            self._keepalive_sent_at = time.monotonic()
+            self.transport.write(bytes.fromhex('d300000000'))
+            try:
+                await asyncio.wait_for(self.transport.drain(), self.hub.keepalive_timeout)
+            except asyncio.TimeoutError:
+                raise StaleConnection
+            await asyncio.sleep(self.hub.keepalive_timeout)
+            if self.transport.last_frame_at is None or self.transport.last_frame_at < self._keepalive_sent_at:
+                raise StaleConnection
         raise ShuttingDown
 
-    def _add_connected_devices(self,switch_id, home_id):
-        for dev in self.switchID_to_deviceIDs[switch_id]:
-            #update list of WiFi connected devices
-            if dev not in self.connected_devices[home_id]:
-                self.connected_devices[home_id].append(dev)
-                if self.connected_devices_updated:
-                    for dev in self.cync_switches.values():
-                        dev.update_controllers()
-                    for room in self.cync_rooms.values():
-                        room.update_controllers()
+    def request_keepalive(self):
+        """Send a heartbeat now rather than waiting for the next interval, to check the connection is still alive"""
+        if self._keepalive_probe is not None:
+            self.hub.loop.call_soon_threadsafe(self._keepalive_probe.set)
+
+    def _connected_devices(self, home_id):
+        """Return the connected devices of a home that are controlled through this session"""
+        return [dev for dev in self.hub.connected_devices[home_id] if self.hub.cync_switches[dev].switch_id in self.controllers]
 
     async def _update_connected_devices(self):
-        while not self.shutting_down:
+        while not self.hub.shutting_down:
             self.connected_devices_updated = False
-            for devices in self.connected_devices.values():
-                devices.clear()
+            for home_id in self.home_controllers:
+                self.hub.connected_devices[home_id] = {dev:None for dev in self.hub.connected_devices[home_id] if self.hub.cync_switches[dev].switch_id not in self.controllers}
             while not self.logged_in:
                 await asyncio.sleep(2)
             attempts = 0
-            while True in [len(devices) < len(self.home_controllers[home_id]) * 0.5 for home_id,devices in self.connected_devices.items()] and attempts < 10:
+            while True in [len(self._connected_devices(home_id)) < len(home_controllers) * 0.5 for home_id,home_controllers in self.home_controllers.items()] and attempts < 10:
                 for home_id, home_controllers in self.home_controllers.items():
                     for controller in home_controllers:
-                        seq = self.get_seq_num()
+                        seq = self.hub.get_seq_num()
                         ping = bytes.fromhex('a300000007') + int(controller).to_bytes(4,'big') + seq.to_bytes(2,'big') + bytes.fromhex('00')
-                        self.loop.call_soon_threadsafe(self.send_request, ping)
+                        self.hub.loop.call_soon_threadsafe(self.send_request, ping, PRIORITY_DISCOVERY)
                         await asyncio.sleep(0.15)
                 await asyncio.sleep(2)
                 attempts += 1
-            for dev in self.cync_switches.values():
+            for dev in self.hub.cync_switches.values():
                 dev.update_controllers()
-            for room in self.cync_rooms.values():
+            for room in self.hub.cync_rooms.values():
                 room.update_controllers()
             self.connected_devices_updated = True
+            self.hub.state_changed()
             await asyncio.sleep(3600)
         raise ShuttingDown
 
+    def state_controller(self, home_id):
+        """Return the controller used to request the state of a home, preferring one known to be connected"""
+        connected_devices = self._connected_devices(home_id)
+        if len(connected_devices) > 0:
+            return self.hub.cync_switches[connected_devices[0]].switch_id
+        return self.home_controllers[home_id][0]
+
     async def _update_state(self):
         while not self.connected_devices_updated:
             await asyncio.sleep(2)
-        for connected_devices in self.connected_devices.values():
-            if len(connected_devices) > 0:
-                controller = self.cync_switches[connected_devices[0]].switch_id
-                seq = self.get_seq_num()
-                state_request = bytes.fromhex('7300000018') + int(controller).to_bytes(4,'big') + seq.to_bytes(2,'big') + bytes.fromhex('007e00000000f85206000000ffff0000567e')
-                self.loop.call_soon_threadsafe(self.send_request,state_request)
-        while False in [self.cync_switches[dev_id]._update_callback is not None for dev_id in self.options["switches"]] and False in [self.cync_rooms[dev_id]._update_callback is not None for dev_id in self.options["rooms"]]:
+        for home_id in self.home_controllers:
+            if len(self._connected_devices(home_id)) > 0:
+                self.hub.loop.call_soon_threadsafe(self.send_request,self.hub.state_request(self.state_controller(home_id)),PRIORITY_STATE)
+        while False in [self.hub.cync_switches[dev_id]._update_callback is not None for dev_id in self.hub.options["switches"]] and False in [self.hub.cync_rooms[dev_id]._update_callback is not None for dev_id in self.hub.options["rooms"]]:
             await asyncio.sleep(2)
-        for dev in self.cync_switches.values():
-            dev.publish_update()
-        for room in self.cync_rooms.values():
-            dev.publish_update()
-
-    def send_request(self,request):
-        async def send():
-            self.writer.write(request)
-            await self.writer.drain()
-        self.loop.create_task(send())
-
-    def combo_control(self,state,brightness,color_tone,rgb,switch_id,mesh_id,seq):
-        combo_request = bytes.fromhex('7300000022') + int(switch_id).to_bytes(4,'big') + int(seq).to_bytes(2,'big') + bytes.fromhex('007e00000000f8f010000000000000') + mesh_id + bytes.fromhex('f00000') + (1 if state else 0).to_bytes(1,'big')  + brightness.to_bytes(1,'big') + color_tone.to_bytes(1,'big') + rgb[0].to_bytes(1,'big') + rgb[1].to_bytes(1,'big') + rgb[2].to_bytes(1,'big') + ((496 + int(mesh_id[0]) + int(mesh_id[1]) + (1 if state else 0) + brightness + color_tone + sum(rgb))%256).to_bytes(1,'big') + bytes.fromhex('7e')
-        self.loop.call_soon_threadsafe(self.send_request,combo_request)
-
-    def turn_on(self,switch_id,mesh_id,seq):
-        power_request = bytes.fromhex('730000001f') + int(switch_id).to_bytes(4,'big') + int(seq).to_bytes(2,'big') + bytes.fromhex('007e00000000f8d00d000000000000') + mesh_id + bytes.fromhex('d00000010000') + ((430 + int(mesh_id[0]) + int(mesh_id[1]))%256).to_bytes(1,'big') + bytes.fromhex('7e')
-        self.loop.call_soon_threadsafe(self.send_request,power_request)
-
-    def turn_off(self,switch_id,mesh_id,seq):
-        power_request = bytes.fromhex('730000001f') + int(switch_id).to_bytes(4,'big') + int(seq).to_bytes(2,'big') + bytes.fromhex('007e00000000f8d00d000000000000') + mesh_id + bytes.fromhex('d00000000000') + ((429 + int(mesh_id[0]) + int(mesh_id[1]))%256).to_bytes(1,'big') + bytes.fromhex('7e')
-        self.loop.call_soon_threadsafe(self.send_request,power_request)
-
-    def set_color_temp(self,color_temp,switch_id,mesh_id,seq):
-        color_temp_request = bytes.fromhex('730000001e') + int(switch_id).to_bytes(4,'big') + int(seq).to_bytes(2,'big') + bytes.fromhex('007e00000000f8e20c000000000000') + mesh_id + bytes.fromhex('e2000005') + color_temp.to_bytes(1,'big') + ((469 + int(mesh_id[0]) + int(mesh_id[1]) + color_temp)%256).to_bytes(1,'big') + bytes.fromhex('7e')
-        self.loop.call_soon_threadsafe(self.send_request,color_temp_request)
+        for dev in self.hub.cync_switches.values():
+            if dev.home_id in self.home_controllers:
+                dev.publish_update()
+        for room in self.hub.cync_rooms.values():
+            if room.home_id in self.home_controllers:
+                room.publish_update()
+
+    def send_request(self, request, priority=PRIORITY_CONTROL, controller=None):
+        """Queue a request for the writer, requests with a controller are also limited by that controller's rate"""
+        self.outbound[priority].append((time.monotonic(), controller, request))
+        self._outbound_ready.set()
+
+    def close(self):
+        """Cancel the connection tasks and close the connection, which wakes a pending read at once"""
+        for task in self._tasks:
+            task.cancel()
+        self.logged_in = False
+        if self.transport is not None:
+            self.transport.close()
+
+    def queue_ack(self, switch_id, response_id):
+        """Add the response to a 0x73 push to the acks written together once the current read is processed"""
+        template = self._ack_templates.get(switch_id)
+        if template is None:
+            template = self._ack_templates[switch_id] = bytes.fromhex('7300000007') + int(switch_id).to_bytes(4,'big')
+        self._pending_acks += template
+        self._pending_acks += response_id
+        self._pending_acks.append(0)
+        self.hub.metrics.push_acks += 1
+
+    def flush_acks(self):
+        if self._pending_acks:
+            self.send_request(bytes(self._pending_acks), PRIORITY_ACK)
+            self._pending_acks.clear()
+
+    def _queued(self):
+        return sum(len(queue) for queue in self.outbound)
+
+    def _next_request(self, now):
+        """
+        Take the next request to write and its priority, or return how long until a controller has a token.
+        Higher classes go first, except that a lower class whose oldest request has waited
+        PRIORITY_MAX_WAIT is served first so housekeeping traffic keeps making progress.
+        """
+        aged = [priority for priority, queue in enumerate(self.outbound) if priority > PRIORITY_CONTROL and len(queue) > 0 and now - queue[0][0] >= PRIORITY_MAX_WAIT]
+        order = aged + [priority for priority in range(len(self.outbound)) if priority not in aged]
+        wait = None
+        for priority in order:
+            queue = self.outbound[priority]
+            for index, (queued_at, controller, request) in enumerate(queue):
+                bucket = self.controller_buckets.get(controller)
+                delay = bucket.delay(now) if bucket is not None else 0
+                if delay == 0:
+                    del queue[index]
+                    if bucket is not None:
+                        bucket.consume()
+                    if priority in aged:
+                        self.hub.metrics.requests_aged += 1
+                    return (priority, queued_at, controller, request), 0
+                wait = delay if wait is None else min(wait, delay)
+        return None, wait
+
+    async def _write_requests(self):
+        """Write queued requests as fast as the connection and controller rate limits allow, draining once per batch"""
+        await self._login_complete.wait()
+        metrics = self.hub.metrics
+        #runs until the session is closed, shutdown cancels this task along with the other connection tasks
+        while True:
+            if self._queued() == 0:
+                self._outbound_ready.clear()
+                await self._outbound_ready.wait()
+                continue
+            written = 0
+            wait = None
+            while self._queued() > 0:
+                now = time.monotonic()
+                wait = self.connection_bucket.delay(now)
+                if wait > 0:
+                    break
+                entry, wait = self._next_request(now)
+                if entry is None:
+                    break
+                priority, queued_at, controller, request = entry
+                self.connection_bucket.consume()
+                self.transport.write(request)
+                written += 1
+                metrics.requests_written[priority] += 1
+                if priority == PRIORITY_CONTROL:
+                    metrics.queue_wait.record((now - queued_at)*1000)
+                if controller is not None and request[0] == 0x73 and len(request) > 11:
+                    self.hub.in_flight.written(int.from_bytes(request[9:11],'big'))
+            if written > 0:
+                await self.transport.drain()
+            elif wait:
+                self._outbound_ready.clear()
+                try:
+                    await asyncio.wait_for(self._outbound_ready.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
 
-    def get_seq_num(self):
-        if self._seq_num == 65535:
-            self._seq_num = 1
-        else:
-            self._seq_num += 1
-        return self._seq_num
+    def snapshot(self):
+        return {'controllers':len(self.controllers), 'homes':len(self.home_controllers), 'logged_in':self.logged_in, 'connected_devices_updated':self.connected_devices_updated, 'queued_requests':dict(zip(PRIORITY_NAMES, [len(queue) for queue in self.outbound]))}
 
 class CyncRoom:
 
@@ -340,8 +1344,8 @@ class CyncRoom:
         self.subgroups = room_info.get('subgroups',[])
         self.is_subgroup = room_info.get('isSubgroup', False)
         self.all_room_switches = self.switches
-        self.controllers = []
         self.default_controller = room_info.get('room_controller',self.hub.home_controllers[self.home_id][0])
+        self.controller_view = CyncControllerView(self.default_controller)
         self._update_callback = None
         self._update_parent_room = None
         self.support_brightness = False
@@ -386,6 +1390,11 @@ class CyncRoom:
     def register_room_updater(self, parent_updater):
         self._update_parent_room = parent_updater
 
+    @property
+    def unique_id(self) -> str:
+        """Return the unique id of the light entity of the room."""
+        return 'cync_room_' + '-'.join(self.switches) + '_' + '-'.join(self.subgroups)
+
     @property
     def max_color_temp_kelvin(self) -> int:
         """Return maximum supported color temperature."""
@@ -396,16 +1405,18 @@ class CyncRoom:
         """Return minimum supported color temperature."""
         return 2000
 
-    async def turn_on(self, attr_rgb, attr_br, attr_ct) -> None:
+    async def turn_on(self, attr_rgb, attr_br, attr_ct, transition=None) -> None:
         """Turn on the light."""
-        attempts = 0
-        update_received = False
-        while not update_received and attempts < int(self._command_retry_time/self._command_timout):
-            seq = str(self.hub.get_seq_num())
-            if len(self.controllers) > 0:
-                controller = self.controllers[attempts%len(self.controllers)]
-            else:
-                controller = self.default_controller
+        if transition and self.support_brightness:
+            if not await self.hub.transition(self, attr_rgb, attr_br, attr_ct, transition):
+                return
+            await self.hub.send_command(self, self.on_command(attr_rgb, attr_br, attr_ct), stop_transition=False)
+        else:
+            await self.hub.send_command(self, self.on_command(attr_rgb, attr_br, attr_ct))
+
+    def on_command(self, attr_rgb, attr_br, attr_ct):
+        """Return a function sending the turn on command through a controller with a sequence number"""
+        def send(controller, seq):
             if attr_rgb is not None and attr_br is not None:
                 if math.isclose(attr_br, max([self.rgb['r'],self.rgb['g'],self.rgb['b']])*self.brightness/100, abs_tol = 2):
                     self.hub.combo_control(True, self.brightness, 254, attr_rgb, controller, self.mesh_id, seq)
@@ -423,43 +1434,28 @@ class CyncRoom:
                 self.hub.set_color_temp(color_temp, controller, self.mesh_id, seq)
             else:
                 self.hub.turn_on(controller, self.mesh_id, seq)
-            self.hub.pending_commands[seq] = self.command_received
-            await asyncio.sleep(self._command_timout)
-            if self.hub.pending_commands.get(seq, None) is not None:
-                self.hub.pending_commands.pop(seq)
-                attempts += 1
-            else:
-                update_received = True
+        return send
 
-    async def turn_off(self, **kwargs: Any) -> None:
+    async def turn_off(self, transition=None, **kwargs: Any) -> None:
         """Turn off the light."""
-        attempts = 0
-        update_received = False
-        while not update_received and attempts < int(self._command_retry_time/self._command_timout):
-            seq = str(self.hub.get_seq_num())
-            if len(self.controllers) > 0:
-                controller = self.controllers[attempts%len(self.controllers)]
-            else:
-                controller = self.default_controller
-            self.hub.turn_off(controller, self.mesh_id, seq)
-            self.hub.pending_commands[seq] = self.command_received
-            await asyncio.sleep(self._command_timout)
-            if self.hub.pending_commands.get(seq, None) is not None:
-                self.hub.pending_commands.pop(seq)
-                attempts += 1
-            else:
-                update_received = True
+        if transition and self.support_brightness and self.power_state:
+            if not await self.hub.transition(self, None, 0, None, transition):
+                return
+            await self.hub.send_command(self, self.off_command(), stop_transition=False)
+        else:
+            await self.hub.send_command(self, self.off_command())
 
-    def command_received(self, seq):
-        """Remove command from hub.pending_commands when a reply is received from Cync server"""
-        if self.hub.pending_commands.get(seq) is not None:
-            self.hub.pending_commands.pop(seq)
+    def off_command(self):
+        """Return a function sending the turn off command through a controller with a sequence number"""
+        def send(controller, seq):
+            self.hub.turn_off(controller, self.mesh_id, seq)
+        return send
 
     def update_room(self):
         """Update the current state of the room"""
         _brightness = self.brightness
         _color_temp = self.color_temp
-        _rgb = self.rgb
+        _rgb = dict(self.rgb)
         _power_state = True in ([self.hub.cync_switches[device_id].power_state for device_id in self.switches] + [self.hub.cync_rooms[room_id].power_state for room_id in self.subgroups])
         if self.support_brightness:
             _brightness = round(sum([self.hub.cync_switches[device_id].brightness for device_id in self.switches] + [self.hub.cync_rooms[room_id].brightness for room_id in self.subgroups])/(len(self.switches) + len(self.subgroups)))
@@ -477,27 +1473,24 @@ class CyncRoom:
             self.brightness = _brightness
             self.color_temp = _color_temp
             self.rgb = _rgb
-        self.publish_update()
-        if self._update_parent_room:
-            self._update_parent_room()
+            self.publish_update()
+            if self._update_parent_room:
+                self._update_parent_room()
+        else:
+            self.hub.metrics.updates_suppressed += 1
+
+    @property
+    def controllers(self):
+        """Responsive, Wi-Fi connected controllers, those of the room's own switches first"""
+        return self.controller_view.controllers
 
     def update_controllers(self):
-        """Update the list of responsive, Wi-Fi connected controller devices"""
-        connected_devices = self.hub.connected_devices[self.home_id]
-        controllers = []
-        if len(connected_devices) > 0:
-            controllers = [self.hub.cync_switches[dev_id].switch_id for dev_id in self.all_room_switches if dev_id in connected_devices]
-            others_available = [self.hub.cync_switches[dev_id].switch_id for dev_id in connected_devices]
-            for controller in controllers:
-                if controller in others_available:
-                    others_available.remove(controller)
-            self.controllers = controllers + others_available
-        else:
-            self.controllers = [self.default_controller]
+        """Rebuild the list of responsive, Wi-Fi connected controller devices"""
+        self.controller_view.rebuild(self.all_room_switches, self.hub.connected_devices[self.home_id], self.hub.cync_switches)
 
     def publish_update(self):
         if self._update_callback:
-            self._update_callback()
+            self.hub.queue_state_write(self)
 
 class CyncSwitch:
 
@@ -505,7 +1498,7 @@ class CyncSwitch:
         self.hub = hub
         self.device_id = device_id
         self.switch_id = switch_info.get('switch_id','0')
-        self.home_id = [home_id for home_id, home_devices in self.hub.home_devices.items() if self.device_id in home_devices][0]
+        self.home_id = [home_id for home_id, mesh in self.hub.home_devices.items() if self.device_id in mesh][0]
         self.name = switch_info.get('name','unknown')
         self.home_name = switch_info.get('home_name','unknown')
         self.mesh_id = switch_info.get('mesh_id',0).to_bytes(2,'little')
@@ -515,7 +1508,7 @@ class CyncSwitch:
         self.color_temp = 0
         self.rgb = {'r':0, 'g':0, 'b':0, 'active':False}
         self.default_controller = switch_info.get('switch_controller',self.hub.home_controllers[self.home_id][0])
-        self.controllers = []
+        self.controller_view = CyncControllerView(self.default_controller)
         self._update_callback = None
         self._update_parent_room = None
         self.support_brightness = switch_info.get('BRIGHTNESS',False)
@@ -524,6 +1517,13 @@ class CyncSwitch:
         self.plug = switch_info.get('PLUG',False)
         self.fan = switch_info.get('FAN',False)
         self.elements = switch_info.get('MULTIELEMENT',1)
+        if self.elements > 1:
+            #the element devices sit at mesh index + 256, + 512, ... in the home's mesh
+            mesh = self.hub.home_devices[self.home_id]
+            index = mesh.index(self.device_id)
+            self.element_device_ids = [device_id for device_id in (mesh.device((i+1)*256 + index) for i in range(self.elements)) if device_id is not None]
+        else:
+            self.element_device_ids = []
         self._command_timout = 0.5
         self._command_retry_time = 5
 
@@ -548,16 +1548,18 @@ class CyncSwitch:
         """Return minimum supported color temperature."""
         return 2000
 
-    async def turn_on(self, attr_rgb, attr_br, attr_ct) -> None:
+    async def turn_on(self, attr_rgb, attr_br, attr_ct, transition=None) -> None:
         """Turn on the light."""
-        attempts = 0
-        update_received = False
-        while not update_received and attempts < int(self._command_retry_time/self._command_timout):
-            seq = str(self.hub.get_seq_num())
-            if len(self.controllers) > 0:
-                controller = self.controllers[attempts%len(self.controllers)]
-            else:
-                controller = self.default_controller
+        if transition and self.support_brightness:
+            if not await self.hub.transition(self, attr_rgb, attr_br, attr_ct, transition):
+                return
+            await self.hub.send_command(self, self.on_command(attr_rgb, attr_br, attr_ct), stop_transition=False)
+        else:
+            await self.hub.send_command(self, self.on_command(attr_rgb, attr_br, attr_ct))
+
+    def on_command(self, attr_rgb, attr_br, attr_ct):
+        """Return a function sending the turn on command through a controller with a sequence number"""
+        def send(controller, seq):
             if attr_rgb is not None and attr_br is not None:
                 if math.isclose(attr_br, max([self.rgb['r'],self.rgb['g'],self.rgb['b']])*self.brightness/100, abs_tol = 2):
                     self.hub.combo_control(True, self.brightness, 254, attr_rgb, controller, self.mesh_id, seq)
@@ -574,82 +1576,68 @@ class CyncSwitch:
                 self.hub.set_color_temp(color_temp, controller, self.mesh_id, seq)
             else:
                 self.hub.turn_on(controller, self.mesh_id, seq)
-            self.hub.pending_commands[seq] = self.command_received
-            await asyncio.sleep(self._command_timout)
-            if self.hub.pending_commands.get(seq, None) is not None:
-                self.hub.pending_commands.pop(seq)
-                attempts += 1
-            else:
-                update_received = True
+        return send
 
-    async def turn_off(self, **kwargs: Any) -> None:
+    async def turn_off(self, transition=None, **kwargs: Any) -> None:
         """Turn off the light."""
-        attempts = 0
-        update_received = False
-        while not update_received and attempts < int(self._command_retry_time/self._command_timout):
-            seq = str(self.hub.get_seq_num())
-            if len(self.controllers) > 0:
-                controller = self.controllers[attempts%len(self.controllers)]
-            else:
-                controller = self.default_controller
-            self.hub.turn_off(controller, self.mesh_id, seq)
-            self.hub.pending_commands[seq] = self.command_received
-            await asyncio.sleep(self._command_timout)
-            if self.hub.pending_commands.get(seq, None) is not None:
-                self.hub.pending_commands.pop(seq)
-                attempts += 1
-            else:
-                update_received = True
+        if transition and self.support_brightness and self.power_state:
+            if not await self.hub.transition(self, None, 0, None, transition):
+                return
+            await self.hub.send_command(self, self.off_command(), stop_transition=False)
+        else:
+            await self.hub.send_command(self, self.off_command())
 
-    def command_received(self, seq):
-        """Remove command from hub.pending_commands when a reply is received from Cync server"""
-        if self.hub.pending_commands.get(seq) is not None:
-            self.hub.pending_commands.pop(seq)
+    def off_command(self):
+        """Return a function sending the turn off command through a controller with a sequence number"""
+        def send(controller, seq):
+            self.hub.turn_off(controller, self.mesh_id, seq)
+        return send
 
     def update_switch(self,state,brightness,color_temp,rgb):
         """Update the state of the switch as updates are received from the Cync server"""
         self.update_received = True
+        brightness = brightness if self.support_brightness and state else 100 if state else 0
         if self.power_state != state or self.brightness != brightness or self.color_temp != color_temp or self.rgb != rgb:
             self.power_state = state
-            self.brightness = brightness if self.support_brightness and state else 100 if state else 0
+            self.brightness = brightness
             self.color_temp = color_temp
             self.rgb = rgb
-        self.publish_update()
-        if self._update_parent_room:
-            self._update_parent_room()
+            self.hub.forget_push(self.device_id)
+            self.publish_update()
+            if self._update_parent_room:
+                self._update_parent_room()
+            self.hub.state_changed()
+        else:
+            self.hub.metrics.updates_suppressed += 1
+
+    @property
+    def controllers(self):
+        """Responsive, Wi-Fi connected controllers, this device first if it is connected, then those of its room"""
+        return self.controller_view.controllers
 
     def update_controllers(self):
-        """Update the list of responsive, Wi-Fi connected controller devices"""
-        connected_devices = self.hub.connected_devices[self.home_id]
-        controllers = []
-        if len(connected_devices) > 0:
-            if int(self.switch_id) > 0:
-                if self.device_id in connected_devices:
-                    #if this device is connected, make this the first available controller
-                    controllers.append(self.switch_id)
-            if self.room:
-                controllers = controllers + [self.hub.cync_switches[device_id].switch_id for device_id in self.room.all_room_switches if device_id in connected_devices and device_id != self.device_id]
-            others_available = [self.hub.cync_switches[device_id].switch_id for device_id in connected_devices]
-            for controller in controllers:
-                if controller in others_available:
-                    others_available.remove(controller)
-            self.controllers = controllers + others_available
-        else:
-            self.controllers = [self.default_controller]
+        """Rebuild the list of responsive, Wi-Fi connected controller devices"""
+        #if this device is connected, it is the first available controller
+        preferred_devices = [self.device_id] + (self.room.all_room_switches if self.room else [])
+        self.controller_view.rebuild(preferred_devices, self.hub.connected_devices[self.home_id], self.hub.cync_switches)
 
     def publish_update(self):
         if self._update_callback:
-            self._update_callback()
+            self.hub.queue_state_write(self)
 
 class CyncMotionSensor:
 
-    def __init__(self, device_id, device_info, room):
+    def __init__(self, device_id, device_info, room, hub):
 
+        self.hub = hub
         self.device_id = device_id
         self.name = device_info['name']
         self.home_name = device_info['home_name']
         self.room = room
         self.motion = False
+        self.last_event = None
+        self.received_at = None
+        self.latency_ms = None
         self._update_callback = None
 
     def register(self, update_callback) -> None:
@@ -661,22 +1649,31 @@ class CyncMotionSensor:
         self._update_callback = None
 
     def update_motion_sensor(self,motion):
-        self.motion = motion
-        self.publish_update()
+        if self.motion != motion:
+            self.motion = motion
+            self.last_event = self.hub.frames_received_time
+            self.received_at = self.hub.frames_received_at
+            self.publish_update()
+        else:
+            self.hub.metrics.updates_suppressed += 1
 
     def publish_update(self):
         if self._update_callback:
-            self._update_callback()
+            self.hub.queue_state_write(self, sensor=True)
 
 class CyncAmbientLightSensor:
 
-    def __init__(self, device_id, device_info, room):
+    def __init__(self, device_id, device_info, room, hub):
 
+        self.hub = hub
         self.device_id = device_id
         self.name = device_info['name']
         self.home_name = device_info['home_name']
         self.room = room
         self.ambient_light = False
+        self.last_event = None
+        self.received_at = None
+        self.latency_ms = None
         self._update_callback = None
 
     def register(self, update_callback) -> None:
@@ -688,12 +1685,117 @@ class CyncAmbientLightSensor:
         self._update_callback = None
 
     def update_ambient_light_sensor(self,ambient_light):
-        self.ambient_light = ambient_light
-        self.publish_update()
+        if self.ambient_light != ambient_light:
+            self.ambient_light = ambient_light
+            self.last_event = self.hub.frames_received_time
+            self.received_at = self.hub.frames_received_at
+            self.publish_update()
+        else:
+            self.hub.metrics.updates_suppressed += 1
 
     def publish_update(self):
         if self._update_callback:
-            self._update_callback()
+            self.hub.queue_state_write(self, sensor=True)
+
+def _is_sensor_frame(frame):
+    packet_type, packet, packet_length = frame
+    return (packet_type == 115 or packet_type == 131) and packet_length >= 25 and packet[13] == 84
+
+def _write_states(devices, metrics):
+    """
+    Run the update callbacks of a batch of changed devices on the Home Assistant loop.
+    A sensor event gets the time from reading its frame to this state write as latency_ms before its callback runs,
+    so the entity can expose it, and the same value goes into the sensor latency histogram.
+    """
+    for device in devices:
+        if device._update_callback:
+            received_at = getattr(device, 'received_at', None)
+            if received_at is not None:
+                device.latency_ms = round((time.monotonic() - received_at)*1000, 2)
+                metrics.sensor_latency.record(device.latency_ms)
+                device.received_at = None
+            device._update_callback()
+
+def compact_cync_config(cync_config):
+    """
+    Pack a cync_config into the form kept in the config entry.
+    Each home holds its rooms and devices, the capabilities of a device are one bit mask, home and room names are stored once
+    in a shared name table, and whatever can be worked out again (mesh index map, controller lists, home and room names
+    of devices) is left out.
+    A device is [name, mesh index, switch id, capabilities, room group id or None, switch controller or 0, elements],
+    a room is [name, room controller, is subgroup, mesh indexes of its switches, group ids of its subgroups].
+    """
+    names = []
+    name_refs = {}
+    def name_ref(name):
+        if name not in name_refs:
+            name_refs[name] = len(names)
+            names.append(name)
+        return name_refs[name]
+
+    device_homes = {device_id:home_id for home_id, mesh in cync_config['home_devices'].items() for device_id in mesh.values()}
+    homes = {home_id:[None, {}, {}] for home_id in cync_config['home_devices']}
+    for device_id, device in cync_config['devices'].items():
+        home = homes[device_homes[device_id]]
+        if home[0] is None:
+            home[0] = name_ref(device['home_name'])
+        capabilities = sum(1 << bit for bit, flag in enumerate(CAPABILITY_FLAGS) if device.get(flag, False))
+        group = int(device['room'].split('-', 1)[1]) if device['room'] else None
+        home[2][device_id] = [device['name'], device['mesh_id'], int(device['switch_id']), capabilities, group, device.get('switch_controller', 0), device.get('MULTIELEMENT', 1)]
+    for room_id, room in cync_config['rooms'].items():
+        home_id, group = room_id.split('-', 1)
+        homes[home_id][1][group] = [name_ref(room['name']), room['room_controller'], int(room['isSubgroup']), [cync_config['devices'][device_id]['mesh_id'] for device_id in room['switches']], [int(subgroup.split('-', 1)[1]) for subgroup in room['subgroups']]]
+    return {'names':names, 'homes':homes}
+
+def expand_cync_config(compact):
+    """Unpack a config stored by compact_cync_config into the cync_config used by the hub and the config flow"""
+    names = compact['names']
+    #accounts only use a handful of capability combinations, so each mask is decoded once
+    capability_flags = {}
+    home_devices = {}
+    home_controllers = {}
+    switchID_to_homeID = {}
+    devices = {}
+    rooms = {}
+    for home_id, (home_name_ref, home_rooms, home_device_records) in compact['homes'].items():
+        home_name = names[home_name_ref]
+        mesh = home_devices[home_id] = {}
+        home_controllers[home_id] = []
+        for device_id, (name, mesh_id, switch_id, capabilities, group, switch_controller, elements) in home_device_records.items():
+            flags = capability_flags.get(capabilities)
+            if flags is None:
+                flags = capability_flags[capabilities] = {flag:capabilities & (1 << bit) > 0 for bit, flag in enumerate(CAPABILITY_FLAGS)}
+            device = {'name':name, 'mesh_id':mesh_id, 'switch_id':str(switch_id), **flags, 'home_name':home_name}
+            if group is not None:
+                device['room'] = f'{home_id}-{group}'
+                device['room_name'] = names[home_rooms[str(group)][0]]
+            else:
+                device['room'] = ''
+                device['room_name'] = ''
+            if elements > 1:
+                device['MULTIELEMENT'] = elements
+            if switch_controller:
+                device['switch_controller'] = switch_controller
+            if device['WIFICONTROL'] and switch_id > 0:
+                switchID_to_homeID[str(switch_id)] = home_id
+                home_controllers[home_id].append(switch_id)
+            mesh[str(mesh_id)] = device_id
+            devices[device_id] = device
+        for group, (name_ref, room_controller, is_subgroup, switches, subgroups) in home_rooms.items():
+            rooms[f'{home_id}-{group}'] = {'name':names[name_ref],
+                'mesh_id' : int(group),
+                'room_controller' : room_controller,
+                'home_name' : home_name,
+                'switches' : [mesh[str(index)] for index in switches],
+                'isSubgroup' : is_subgroup > 0,
+                'subgroups' : [f'{home_id}-{subgroup}' for subgroup in subgroups]
+            }
+    for room_info in rooms.values():
+        if not room_info['isSubgroup']:
+            for subgroup in room_info['subgroups']:
+                if subgroup in rooms:
+                    rooms[subgroup]['parent_room'] = room_info['name']
+    return {'rooms':rooms, 'devices':devices, 'home_devices':home_devices, 'home_controllers':home_controllers, 'switchID_to_homeID':switchID_to_homeID}
 
 class CyncUserData:
 
@@ -750,14 +1852,14 @@ class CyncUserData:
             home_info = await self._get_home_properties(home['product_id'], home['id'])
             if home_info.get('groupsArray',False) and home_info.get('bulbsArray',False) and len(home_info['groupsArray']) > 0 and len(home_info['bulbsArray']) > 0:
                 home_id = str(home['id'])
-                bulbs_array_length = max([((device['deviceID'] % home['id']) % 1000) + (int((device['deviceID'] % home['id']) / 1000)*256) for device in home_info['bulbsArray']]) + 1
-                home_devices[home_id] = [""]*(bulbs_array_length)
+                #only the occupied mesh indexes are kept, keyed by the index as a string so the config survives being saved
+                home_devices[home_id] = {}
                 home_controllers[home_id] = []
                 for device in home_info['bulbsArray']:
                     device_type = device['deviceType']
                     device_id = str(device['deviceID'])
                     current_index = ((device['deviceID'] % home['id']) % 1000) + (int((device['deviceID'] % home['id']) / 1000)*256)
-                    home_devices[home_id][current_index] = device_id
+                    home_devices[home_id][str(current_index)] = device_id
                     devices[device_id] = {'name':device['displayName'],
                         'mesh_id':current_index,
                         'switch_id':str(device.get('switchID',0)),
@@ -791,20 +1893,21 @@ class CyncUserData:
                         if (len(room.get('deviceIDArray',[])) + len(room.get('subgroupIDArray',[]))) > 0:
                             room_id = home_id + '-' + str(room['groupID'])
                             room_controller = home_controllers[home_id][0]
-                            available_room_controllers = [(id%1000) + (int(id/1000)*256) for id in room.get('deviceIDArray',[]) if 'switch_controller' in devices[home_devices[home_id][(id%1000)+(int(id/1000)*256)]]]
+                            #rooms can still list devices that are no longer in the home's mesh
+                            room_devices = [device_id for device_id in (home_devices[home_id].get(str((id%1000) + (int(id/1000)*256))) for id in room.get('deviceIDArray',[])) if device_id in devices]
+                            available_room_controllers = [device_id for device_id in room_devices if 'switch_controller' in devices[device_id]]
                             if len(available_room_controllers) > 0:
-                                room_controller = devices[home_devices[home_id][available_room_controllers[0]]]['switch_controller']
-                            for id in room.get('deviceIDArray',[]):
-                                id = (id % 1000) + (int(id / 1000)*256)
-                                devices[home_devices[home_id][id]]['room'] = room_id
-                                devices[home_devices[home_id][id]]['room_name'] = room['displayName']
-                                if 'switch_controller' not in devices[home_devices[home_id][id]] and devices[home_devices[home_id][id]].get('ONOFF',False):
-                                    devices[home_devices[home_id][id]]['switch_controller'] = room_controller
+                                room_controller = devices[available_room_controllers[0]]['switch_controller']
+                            for device_id in room_devices:
+                                devices[device_id]['room'] = room_id
+                                devices[device_id]['room_name'] = room['displayName']
+                                if 'switch_controller' not in devices[device_id] and devices[device_id].get('ONOFF',False):
+                                    devices[device_id]['switch_controller'] = room_controller
                             rooms[room_id] = {'name':room['displayName'],
                                 'mesh_id' : room['groupID'],
                                 'room_controller' : room_controller,
                                 'home_name' : home['name'],
-                                'switches' : [home_devices[home_id][(i%1000)+(int(i/1000)*256)] for i in room.get('deviceIDArray',[]) if devices[home_devices[home_id][(i%1000)+(int(i/1000)*256)]].get('ONOFF',False)],
+                                'switches' : [device_id for device_id in room_devices if devices[device_id].get('ONOFF',False)],
                                 'isSubgroup' : room.get('isSubgroup',False),
                                 'subgroups' : [home_id + '-' + str(subgroup) for subgroup in room.get('subgroupIDArray',[])]
                             }
@@ -840,6 +1943,9 @@ class CyncUserData:
 class LostConnection(Exception):
     """Lost connection to Cync Server"""
 
+class StaleConnection(LostConnection):
+    """Connection to Cync Server stopped responding"""
+
 class ShuttingDown(Exception):
     """Cync client shutting down"""
 
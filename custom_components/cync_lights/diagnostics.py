@@ -0,0 +1,44 @@
+"""Diagnostics support for Cync Room Lights."""
+from __future__ import annotations
+from typing import Any
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+from .const import DOMAIN
+
+TO_REDACT = {"cync_credentials", "user_input"}
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    hub = hass.data[DOMAIN][entry.entry_id]
+
+    #home ids and names identify the account, so homes are reported by position only
+    home_labels = {home_id:f"home_{index + 1}" for index, home_id in enumerate(hub.home_controllers)}
+    runtime = hub.runtime_snapshot()
+    runtime["connected_devices"] = {home_labels.get(home_id, home_id):count for home_id, count in runtime["connected_devices"].items()}
+    runtime["loop_lag_ms"] = await hub.async_measure_loop_lag()
+
+    homes = {}
+    for home_id, label in home_labels.items():
+        home_rooms = [room for room in hub.cync_rooms.values() if room.home_id == home_id]
+        homes[label] = {
+            "devices": len([switch for switch in hub.cync_switches.values() if switch.home_id == home_id]),
+            "rooms": len([room for room in home_rooms if not room.is_subgroup]),
+            "subgroups": len([room for room in home_rooms if room.is_subgroup]),
+            "controllers": len(hub.home_controllers[home_id]),
+            "connected_devices": len(hub.connected_devices.get(home_id, [])),
+        }
+
+    return {
+        "entry": async_redact_data({"data": {key:value for key, value in entry.data.items() if key != "cync_config"}, "options": {key:(len(value) if isinstance(value, list) else value) for key, value in entry.options.items()}}, TO_REDACT),
+        "topology": {
+            "homes": homes,
+            "devices": sum(len(mesh) for mesh in hub.home_devices.values()),
+            "switches": len(hub.cync_switches),
+            "motion_sensors": len(hub.cync_motion_sensors),
+            "ambient_light_sensors": len(hub.cync_ambient_light_sensors),
+        },
+        "runtime": runtime,
+    }
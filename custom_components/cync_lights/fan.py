@@ -27,58 +27,38 @@ class CyncFanEntity(FanEntity):
     """Representation of a Cync Fan Switch Entity."""
 
     should_poll = False
+    _attr_supported_features = FanEntityFeature.SET_SPEED | FanEntityFeature.TURN_ON | FanEntityFeature.TURN_OFF
+    _attr_speed_count = 4
 
     def __init__(self, cync_switch) -> None:
         """Initialize the light."""
         self.cync_switch = cync_switch
-
-    async def async_added_to_hass(self) -> None:
-        """Run when this Entity has been added to HA."""
-        self.cync_switch.register(self.schedule_update_ha_state)
-
-    async def async_will_remove_from_hass(self) -> None:
-        """Entity being removed from hass."""
-        self.cync_switch.reset()
-
-    @property
-    def device_info(self) -> DeviceInfo:
-        """Return device registry information for this entity."""
-        return DeviceInfo(
+        self._attr_device_info = DeviceInfo(
             identifiers = {(DOMAIN, f"{self.cync_switch.room.name} ({self.cync_switch.home_name})")},
             manufacturer = "Cync by Savant",
             name = f"{self.cync_switch.room.name} ({self.cync_switch.home_name})",
             suggested_area = f"{self.cync_switch.room.name}",
         )
+        self._attr_unique_id = 'cync_switch_' + self.cync_switch.device_id
+        self._attr_name = self.cync_switch.name
+        self._update_attributes()
 
-    @property
-    def unique_id(self) -> str:
-        """Return Unique ID string."""
-        return 'cync_switch_' + self.cync_switch.device_id 
-
-    @property
-    def name(self) -> str:
-        """Return the name of the switch."""
-        return self.cync_switch.name
-
-    @property
-    def supported_features(self) -> int:
-        """Return the list of supported features."""
-        return FanEntityFeature.SET_SPEED | FanEntityFeature.TURN_ON | FanEntityFeature.TURN_OFF
+    async def async_added_to_hass(self) -> None:
+        """Run when this Entity has been added to HA."""
+        self.cync_switch.register(self._handle_update)
 
-    @property
-    def is_on(self) -> bool | None:
-        """Return true if fan is on."""
-        return self.cync_switch.power_state
+    async def async_will_remove_from_hass(self) -> None:
+        """Entity being removed from hass."""
+        self.cync_switch.reset()
 
-    @property
-    def percentage(self) -> int | None:
-        """Return the fan speed percentage of this switch"""
-        return self.cync_switch.brightness
+    def _handle_update(self) -> None:
+        """Refresh the state attributes and write the state, called on the Home Assistant loop."""
+        self._update_attributes()
+        self.async_write_ha_state()
 
-    @property
-    def speed_count(self) -> int:
-        """Return the number of speeds the fan supports."""
-        return 4
+    def _update_attributes(self) -> None:
+        self._attr_is_on = self.cync_switch.power_state
+        self._attr_percentage = self.cync_switch.brightness
 
     async def async_turn_on(
         self,
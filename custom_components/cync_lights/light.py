@@ -1,7 +1,7 @@
 """Platform for light integration."""
 from __future__ import annotations
 from typing import Any
-from homeassistant.components.light import (ATTR_BRIGHTNESS, ATTR_COLOR_TEMP_KELVIN, ATTR_RGB_COLOR, ColorMode, LightEntity)
+from homeassistant.components.light import (ATTR_BRIGHTNESS, ATTR_COLOR_TEMP_KELVIN, ATTR_RGB_COLOR, ATTR_TRANSITION, ColorMode, LightEntity, LightEntityFeature)
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
@@ -36,112 +36,49 @@ class CyncRoomEntity(LightEntity):
     def __init__(self, room) -> None:
         """Initialize the light."""
         self.room = room
+        area = self.room.parent_room if self.room.is_subgroup else self.room.name
+        self._attr_device_info = DeviceInfo(
+            identifiers = {(DOMAIN, f"{area} ({self.room.home_name})")},
+            manufacturer = "Cync by Savant",
+            name = f"{area} ({self.room.home_name})",
+            suggested_area = f"{area}",
+        )
+        self._attr_icon = "mdi:lightbulb-group-outline" if self.room.is_subgroup else "mdi:lightbulb-group"
+        self._attr_unique_id = self.room.unique_id
+        self._attr_name = self.room.name
+        self._attr_max_color_temp_kelvin = self.room.max_color_temp_kelvin
+        self._attr_min_color_temp_kelvin = self.room.min_color_temp_kelvin
+        self._attr_supported_color_modes = _supported_color_modes(self.room)
+        self._attr_supported_features = LightEntityFeature.TRANSITION if self.room.support_brightness else LightEntityFeature(0)
+        self._update_attributes()
 
     async def async_added_to_hass(self) -> None:
         """Run when this Entity has been added to HA."""
-        self.room.register(self.schedule_update_ha_state)
+        self.room.register(self._handle_update)
 
     async def async_will_remove_from_hass(self) -> None:
         """Entity being removed from hass."""
         self.room.reset()
 
-    @property
-    def device_info(self) -> DeviceInfo:
-        """Return device registry information for this entity."""
-        return DeviceInfo(
-            identifiers = {(DOMAIN, f"{self.room.parent_room if self.room.is_subgroup else self.room.name} ({self.room.home_name})")},
-            manufacturer = "Cync by Savant",
-            name = f"{self.room.parent_room if self.room.is_subgroup else self.room.name} ({self.room.home_name})",
-            suggested_area = f"{self.room.parent_room if self.room.is_subgroup else self.room.name}",
-        )
+    def _handle_update(self) -> None:
+        """Refresh the state attributes and write the state, called on the Home Assistant loop."""
+        self._update_attributes()
+        self.async_write_ha_state()
 
-    @property
-    def icon(self) -> str | None:
-        """Icon of the entity."""
-        if self.room.is_subgroup:
-            return "mdi:lightbulb-group-outline"
-        else:
-            return "mdi:lightbulb-group"
-
-    @property
-    def unique_id(self) -> str:
-        """Return Unique ID string."""
-        uid =  'cync_room_' + '-'.join(self.room.switches) + '_' + '-'.join(self.room.subgroups)
-        return uid
-
-    @property
-    def name(self) -> str:
-        """Return the name of the room."""
-        return self.room.name
-
-    @property
-    def is_on(self) -> bool | None:
-        """Return true if light is on."""
-        return self.room.power_state
-
-    @property
-    def brightness(self) -> int | None:
-        """Return the brightness of this room between 0..255."""
-        return round(self.room.brightness*255/100)
-
-    @property
-    def max_color_temp_kelvin(self) -> int:
-        """Return maximum supported color temperature."""
-        return self.room.max_color_temp_kelvin
-
-    @property
-    def min_color_temp_kelvin(self) -> int:
-        """Return minimum supported color temperature."""
-        return self.room.min_color_temp_kelvin
-
-    @property
-    def color_temp_kelvin(self) -> int:
-        """Return color temperature in kelvin."""
-        return self.min_color_temp_kelvin + round((self.max_color_temp_kelvin-self.min_color_temp_kelvin)*self.room.color_temp/100)
-
-    @property
-    def rgb_color(self) -> tuple[int, int, int] | None:
-        """Return the RGB color tuple of this light switch"""
-        return (self.room.rgb['r'],self.room.rgb['g'],self.room.rgb['b'])
-
-    @property
-    def supported_color_modes(self) -> set[str] | None:
-        """Return list of available color modes."""
-
-        modes: set[ColorMode | str] = set()
-
-        if self.room.support_color_temp:
-            modes.add(ColorMode.COLOR_TEMP)
-        if self.room.support_rgb:
-            modes.add(ColorMode.RGB)
-        if self.room.support_brightness and not modes:
-            modes.add(ColorMode.BRIGHTNESS)
-        if not modes:
-            modes.add(ColorMode.ONOFF)
-
-        return modes
-
-    @property
-    def color_mode(self) -> str | None:
-        """Return the active color mode."""
-
-        if self.room.support_color_temp:
-            if self.room.support_rgb and self.room.rgb['active']:
-                return ColorMode.RGB
-            else:
-                return ColorMode.COLOR_TEMP
-        if self.room.support_brightness:
-            return ColorMode.BRIGHTNESS
-        else:
-            return ColorMode.ONOFF
+    def _update_attributes(self) -> None:
+        self._attr_is_on = self.room.power_state
+        self._attr_brightness = round(self.room.brightness*255/100)
+        self._attr_color_temp_kelvin = self._attr_min_color_temp_kelvin + round((self._attr_max_color_temp_kelvin-self._attr_min_color_temp_kelvin)*self.room.color_temp/100)
+        self._attr_rgb_color = (self.room.rgb['r'],self.room.rgb['g'],self.room.rgb['b'])
+        self._attr_color_mode = _color_mode(self.room)
 
     async def async_turn_on(self, **kwargs: Any) -> None:
         """Turn on the light."""
-        await self.room.turn_on(kwargs.get(ATTR_RGB_COLOR),kwargs.get(ATTR_BRIGHTNESS),kwargs.get(ATTR_COLOR_TEMP_KELVIN))
+        await self.room.turn_on(kwargs.get(ATTR_RGB_COLOR),kwargs.get(ATTR_BRIGHTNESS),kwargs.get(ATTR_COLOR_TEMP_KELVIN),kwargs.get(ATTR_TRANSITION))
 
     async def async_turn_off(self, **kwargs: Any) -> None:
         """Turn off the light."""
-        await self.room.turn_off()
+        await self.room.turn_off(kwargs.get(ATTR_TRANSITION))
 
 class CyncSwitchEntity(LightEntity):
     """Representation of a Cync Switch Light Entity."""
@@ -151,100 +88,73 @@ class CyncSwitchEntity(LightEntity):
     def __init__(self, cync_switch) -> None:
         """Initialize the light."""
         self.cync_switch = cync_switch
+        self._attr_device_info = DeviceInfo(
+            identifiers = {(DOMAIN, f"{self.cync_switch.room.name} ({self.cync_switch.home_name})")},
+            manufacturer = "Cync by Savant",
+            name = f"{self.cync_switch.room.name} ({self.cync_switch.home_name})",
+            suggested_area = f"{self.cync_switch.room.name}",
+        )
+        self._attr_unique_id = 'cync_switch_' + self.cync_switch.device_id
+        self._attr_name = self.cync_switch.name
+        self._attr_max_color_temp_kelvin = self.cync_switch.max_color_temp_kelvin
+        self._attr_min_color_temp_kelvin = self.cync_switch.min_color_temp_kelvin
+        self._attr_supported_color_modes = _supported_color_modes(self.cync_switch)
+        self._attr_supported_features = LightEntityFeature.TRANSITION if self.cync_switch.support_brightness else LightEntityFeature(0)
+        self._update_attributes()
 
     async def async_added_to_hass(self) -> None:
         """Run when this Entity has been added to HA."""
-        self.cync_switch.register(self.schedule_update_ha_state)
+        self.cync_switch.register(self._handle_update)
 
     async def async_will_remove_from_hass(self) -> None:
         """Entity being removed from hass."""
         self.cync_switch.reset()
 
-    @property
-    def device_info(self) -> DeviceInfo:
-        """Return device registry information for this entity."""
-        return DeviceInfo(
-            identifiers = {(DOMAIN, f"{self.cync_switch.room.name} ({self.cync_switch.home_name})")},
-            manufacturer = "Cync by Savant",
-            name = f"{self.cync_switch.room.name} ({self.cync_switch.home_name})",
-            suggested_area = f"{self.cync_switch.room.name}",
-        )
+    def _handle_update(self) -> None:
+        """Refresh the state attributes and write the state, called on the Home Assistant loop."""
+        self._update_attributes()
+        self.async_write_ha_state()
 
-    @property
-    def unique_id(self) -> str:
-        """Return Unique ID string."""
-        return 'cync_switch_' + self.cync_switch.device_id
-
-    @property
-    def name(self) -> str:
-        """Return the name of the switch."""
-        return self.cync_switch.name
-
-    @property
-    def is_on(self) -> bool | None:
-        """Return true if light is on."""
-        return self.cync_switch.power_state
-
-    @property
-    def brightness(self) -> int | None:
-        """Return the brightness of this switch between 0..255."""
-        return round(self.cync_switch.brightness*255/100)
-
-    @property
-    def max_color_temp_kelvin(self) -> int:
-        """Return maximum supported color temperature."""
-        return self.cync_switch.max_color_temp_kelvin
-
-    @property
-    def min_color_temp_kelvin(self) -> int:
-        """Return minimum supported color temperature."""
-        return self.cync_switch.min_color_temp_kelvin
-
-    @property
-    def color_temp_kelvin(self) -> int | None:
-        """Return the color temperature of this light for HA."""
-        return self.min_color_temp_kelvin + round((self.max_color_temp_kelvin-self.min_color_temp_kelvin)*self.cync_switch.color_temp/100)
-
-    @property
-    def rgb_color(self) -> tuple[int, int, int] | None:
-        """Return the RGB color tuple of this light switch"""
-        return (self.cync_switch.rgb['r'],self.cync_switch.rgb['g'],self.cync_switch.rgb['b'])
-
-    @property
-    def supported_color_modes(self) -> set[str] | None:
-        """Return list of available color modes."""
-
-        modes: set[ColorMode | str] = set()
-
-        if self.cync_switch.support_color_temp:
-            modes.add(ColorMode.COLOR_TEMP)
-        if self.cync_switch.support_rgb:
-            modes.add(ColorMode.RGB)
-        if self.cync_switch.support_brightness and not modes:
-            modes.add(ColorMode.BRIGHTNESS)
-        if not modes:
-            modes.add(ColorMode.ONOFF)
-
-        return modes
-
-    @property
-    def color_mode(self) -> str | None:
-        """Return the active color mode."""
-
-        if self.cync_switch.support_color_temp:
-            if self.cync_switch.support_rgb and self.cync_switch.rgb['active']:
-                return ColorMode.RGB
-            else:
-                return ColorMode.COLOR_TEMP
-        if self.cync_switch.support_brightness:
-            return ColorMode.BRIGHTNESS
-        else:
-            return ColorMode.ONOFF
+    def _update_attributes(self) -> None:
+        self._attr_is_on = self.cync_switch.power_state
+        self._attr_brightness = round(self.cync_switch.brightness*255/100)
+        self._attr_color_temp_kelvin = self._attr_min_color_temp_kelvin + round((self._attr_max_color_temp_kelvin-self._attr_min_color_temp_kelvin)*self.cync_switch.color_temp/100)
+        self._attr_rgb_color = (self.cync_switch.rgb['r'],self.cync_switch.rgb['g'],self.cync_switch.rgb['b'])
+        self._attr_color_mode = _color_mode(self.cync_switch)
 
     async def async_turn_on(self, **kwargs: Any) -> None:
         """Turn on the light."""
-        await self.cync_switch.turn_on(kwargs.get(ATTR_RGB_COLOR),kwargs.get(ATTR_BRIGHTNESS),kwargs.get(ATTR_COLOR_TEMP_KELVIN))
+        await self.cync_switch.turn_on(kwargs.get(ATTR_RGB_COLOR),kwargs.get(ATTR_BRIGHTNESS),kwargs.get(ATTR_COLOR_TEMP_KELVIN),kwargs.get(ATTR_TRANSITION))
 
     async def async_turn_off(self, **kwargs: Any) -> None:
         """Turn off the light."""
-        await self.cync_switch.turn_off()
+        await self.cync_switch.turn_off(kwargs.get(ATTR_TRANSITION))
+
+def _supported_color_modes(device) -> set[ColorMode]:
+    """Return the color modes supported by a room or switch."""
+
+    modes: set[ColorMode | str] = set()
+
+    if device.support_color_temp:
+        modes.add(ColorMode.COLOR_TEMP)
+    if device.support_rgb:
+        modes.add(ColorMode.RGB)
+    if device.support_brightness and not modes:
+        modes.add(ColorMode.BRIGHTNESS)
+    if not modes:
+        modes.add(ColorMode.ONOFF)
+
+    return modes
+
+def _color_mode(device) -> ColorMode:
+    """Return the active color mode of a room or switch."""
+
+    if device.support_color_temp:
+        if device.support_rgb and device.rgb['active']:
+            return ColorMode.RGB
+        else:
+            return ColorMode.COLOR_TEMP
+    if device.support_brightness:
+        return ColorMode.BRIGHTNESS
+    else:
+        return ColorMode.ONOFF
@@ -0,0 +1,81 @@
+"""Platform for sensor integration."""
+from __future__ import annotations
+from typing import Any
+from homeassistant.components.sensor import (SensorDeviceClass, SensorEntity, SensorStateClass)
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import UnitOfInformation, UnitOfTime
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.device_registry import DeviceEntryType
+from homeassistant.helpers.entity import DeviceInfo, EntityCategory
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from .const import DOMAIN
+
+# key, name, device class, unit, state class, value function
+METRIC_SENSORS = [
+    ("frames_received", "Frames Received", None, None, SensorStateClass.TOTAL_INCREASING, lambda metrics: sum(metrics.frames_received)),
+    ("decode_errors", "Decode Errors", None, None, SensorStateClass.TOTAL_INCREASING, lambda metrics: metrics.decode_errors),
+    ("bytes_in", "Bytes In", SensorDeviceClass.DATA_SIZE, UnitOfInformation.BYTES, SensorStateClass.TOTAL_INCREASING, lambda metrics: metrics.bytes_in),
+    ("bytes_out", "Bytes Out", SensorDeviceClass.DATA_SIZE, UnitOfInformation.BYTES, SensorStateClass.TOTAL_INCREASING, lambda metrics: metrics.bytes_out),
+    ("commands_sent", "Commands Sent", None, None, SensorStateClass.TOTAL_INCREASING, lambda metrics: metrics.commands_sent),
+    ("commands_retried", "Commands Retried", None, None, SensorStateClass.TOTAL_INCREASING, lambda metrics: metrics.commands_retried),
+    ("commands_acked", "Commands Acknowledged", None, None, SensorStateClass.TOTAL_INCREASING, lambda metrics: metrics.commands_acked),
+    ("commands_timed_out", "Commands Timed Out", None, None, SensorStateClass.TOTAL_INCREASING, lambda metrics: metrics.commands_timed_out),
+    ("acks_late", "Late Acknowledgements", None, None, SensorStateClass.TOTAL_INCREASING, lambda metrics: metrics.acks_late),
+    ("acks_duplicate", "Duplicate Acknowledgements", None, None, SensorStateClass.TOTAL_INCREASING, lambda metrics: metrics.acks_duplicate),
+    ("ack_latency_p50", "Ack Latency p50", SensorDeviceClass.DURATION, UnitOfTime.MILLISECONDS, SensorStateClass.MEASUREMENT, lambda metrics: metrics.ack_latency.percentile(50)),
+    ("ack_latency_p95", "Ack Latency p95", SensorDeviceClass.DURATION, UnitOfTime.MILLISECONDS, SensorStateClass.MEASUREMENT, lambda metrics: metrics.ack_latency.percentile(95)),
+    ("ack_latency_p99", "Ack Latency p99", SensorDeviceClass.DURATION, UnitOfTime.MILLISECONDS, SensorStateClass.MEASUREMENT, lambda metrics: metrics.ack_latency.percentile(99)),
+    ("queue_wait_p95", "Queue Wait p95", SensorDeviceClass.DURATION, UnitOfTime.MILLISECONDS, SensorStateClass.MEASUREMENT, lambda metrics: metrics.queue_wait.percentile(95)),
+    ("sensor_latency_p95", "Sensor Latency p95", SensorDeviceClass.DURATION, UnitOfTime.MILLISECONDS, SensorStateClass.MEASUREMENT, lambda metrics: metrics.sensor_latency.percentile(95)),
+    ("state_writes", "State Writes", None, None, SensorStateClass.TOTAL_INCREASING, lambda metrics: metrics.state_writes),
+    ("state_write_batches", "State Write Batches", None, None, SensorStateClass.TOTAL_INCREASING, lambda metrics: metrics.state_write_batches),
+    ("updates_suppressed", "Updates Suppressed", None, None, SensorStateClass.TOTAL_INCREASING, lambda metrics: metrics.updates_suppressed),
+    ("pushes_deduplicated", "Duplicate Pushes Dropped", None, None, SensorStateClass.TOTAL_INCREASING, lambda metrics: metrics.pushes_deduplicated),
+    ("reconnects", "Reconnects", None, None, SensorStateClass.TOTAL_INCREASING, lambda metrics: metrics.reconnects),
+]
+
+async def async_setup_entry(
+    hass: HomeAssistant,
+    config_entry: ConfigEntry,
+    async_add_entities: AddEntitiesCallback
+) -> None:
+    hub = hass.data[DOMAIN][config_entry.entry_id]
+
+    async_add_entities([CyncHubMetricSensorEntity(hub, config_entry, *description) for description in METRIC_SENSORS])
+
+
+class CyncHubMetricSensorEntity(SensorEntity):
+    """Representation of a Cync hub diagnostic counter."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+
+    def __init__(self, hub, config_entry, key, name, device_class, unit, state_class, value_fn) -> None:
+        """Initialize the sensor."""
+        self.hub = hub
+        self.entry_id = config_entry.entry_id
+        self.key = key
+        self.value_fn = value_fn
+        self._attr_name = f"Cync Hub {name}"
+        self._attr_device_class = device_class
+        self._attr_native_unit_of_measurement = unit
+        self._attr_state_class = state_class
+        self._attr_device_info = DeviceInfo(
+            identifiers = {(DOMAIN, f"cync_hub_{self.entry_id}")},
+            manufacturer = "Cync by Savant",
+            name = "Cync Hub",
+            entry_type = DeviceEntryType.SERVICE,
+        )
+        self._attr_unique_id = f"cync_hub_{self.entry_id}_{self.key}"
+
+    @property
+    def native_value(self) -> int | None:
+        """Return the current value of the counter."""
+        return self.value_fn(self.hub.metrics)
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any] | None:
+        """Return the per packet type breakdown for the frame counter."""
+        if self.key == "frames_received":
+            return self.hub.metrics.frames_by_type()
+        return None
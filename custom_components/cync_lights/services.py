@@ -0,0 +1,130 @@
+"""Services for the Cync Room Lights integration."""
+from __future__ import annotations
+import asyncio
+import logging
+import time
+import voluptuous as vol
+from homeassistant.core import HomeAssistant, ServiceCall, ServiceResponse, SupportsResponse
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import config_validation as cv, entity_registry as er
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+SERVICE_PROFILE = "profile"
+SERVICE_REFRESH_STATE = "refresh_state"
+SERVICE_APPLY_SCENE = "apply_scene"
+
+PROFILE_SCHEMA = vol.Schema(
+    {
+        vol.Optional("duration", default=60): vol.All(vol.Coerce(float), vol.Range(min=1, max=3600)),
+        vol.Optional("tracemalloc", default=False): cv.boolean,
+    }
+)
+
+REFRESH_STATE_SCHEMA = vol.Schema(
+    {
+        vol.Optional("timeout", default=10): vol.All(vol.Coerce(float), vol.Range(min=1, max=120)),
+    }
+)
+
+SCENE_TARGET_SCHEMA = vol.Schema(
+    {
+        vol.Optional("state", default=True): cv.boolean,
+        vol.Optional("brightness"): vol.All(vol.Coerce(int), vol.Range(min=0, max=255)),
+        vol.Optional("color_temp_kelvin"): vol.All(vol.Coerce(int), vol.Range(min=2000, max=7000)),
+        vol.Optional("rgb_color"): vol.All(vol.ExactSequence((cv.byte, cv.byte, cv.byte)), vol.Coerce(list)),
+    }
+)
+
+APPLY_SCENE_SCHEMA = vol.Schema(
+    {
+        vol.Required("targets"): {cv.string: SCENE_TARGET_SCHEMA},
+        vol.Optional("timeout", default=5): vol.All(vol.Coerce(float), vol.Range(min=1, max=60)),
+    }
+)
+
+def _resolve_scene_target(hass, target_id):
+    """Return the hub and room or switch for a light entity id, a room id or a device id"""
+    entity = er.async_get(hass).async_get(target_id)
+    for entry_id, hub in hass.data[DOMAIN].items():
+        if entity is not None:
+            if entity.config_entry_id != entry_id:
+                continue
+            for room in hub.cync_rooms.values():
+                if entity.unique_id == room.unique_id:
+                    return hub, room
+            device_id = entity.unique_id.removeprefix('cync_switch_')
+            if device_id in hub.cync_switches:
+                return hub, hub.cync_switches[device_id]
+        elif target_id in hub.cync_rooms:
+            return hub, hub.cync_rooms[target_id]
+        elif target_id in hub.cync_switches:
+            return hub, hub.cync_switches[target_id]
+    raise HomeAssistantError(f"Unknown Cync room or switch: {target_id}")
+
+def _write_profile(profiler, snapshot, profile_path, summary_path, memory_path):
+    """Write the profiler results to the config directory"""
+    with open(profile_path, "w", encoding="utf-8") as profile_file:
+        for line in profiler.collapsed():
+            profile_file.write(f"{line}\n")
+    with open(summary_path, "w", encoding="utf-8") as summary_file:
+        if profiler.samples == 0:
+            summary_file.write("no samples, the hub thread was not running\n")
+        else:
+            summary_file.write(f"{profiler.samples} samples every {profiler.interval*1000:g} ms\n{'own':>7} {'total':>7}  function\n")
+            for function, own, total in profiler.top_functions():
+                summary_file.write(f"{own/profiler.samples:>7.1%} {total/profiler.samples:>7.1%}  {function}\n")
+    if snapshot is not None:
+        with open(memory_path, "w", encoding="utf-8") as memory_file:
+            for statistic in snapshot.statistics("lineno")[:50]:
+                memory_file.write(f"{statistic}\n")
+
+async def async_setup_services(hass: HomeAssistant) -> None:
+    """Register the integration services, once for all config entries."""
+    if hass.services.has_service(DOMAIN, SERVICE_PROFILE):
+        return
+
+    async def async_profile(call: ServiceCall) -> None:
+        """Profile the event loop of every Cync hub."""
+        for entry_id, hub in list(hass.data[DOMAIN].items()):
+            profiler, snapshot = await hub.async_profile(call.data["duration"], call.data["tracemalloc"])
+            timestamp = int(time.time())
+            profile_path = hass.config.path(f"cync_lights_profile.{entry_id}.{timestamp}.stacks")
+            summary_path = hass.config.path(f"cync_lights_profile.{entry_id}.{timestamp}.txt")
+            memory_path = hass.config.path(f"cync_lights_memory.{entry_id}.{timestamp}.txt")
+            await hass.async_add_executor_job(_write_profile, profiler, snapshot, profile_path, summary_path, memory_path)
+            _LOGGER.info("Cync hub profile written to %s and %s", profile_path, summary_path)
+            if snapshot is not None:
+                _LOGGER.info("Cync hub allocation snapshot written to %s", memory_path)
+
+    async def async_refresh_state(call: ServiceCall) -> ServiceResponse:
+        """Request the state of every home of every Cync hub and report how long each took to answer."""
+        hubs = list(hass.data[DOMAIN].items())
+        results = await asyncio.gather(*[hub.async_refresh_state(call.data["timeout"]) for entry_id, hub in hubs])
+        return {entry_id:result for (entry_id, hub), result in zip(hubs, results)}
+
+    async def async_apply_scene(call: ServiceCall) -> ServiceResponse:
+        """Apply targets to many rooms and switches at once, returning once every command is confirmed."""
+        hub_targets = {}
+        for target_id, target in call.data["targets"].items():
+            hub, device = _resolve_scene_target(hass, target_id)
+            hub_targets.setdefault(hub, []).append((device, target))
+        hubs = list(hub_targets.items())
+        results = await asyncio.gather(*[hub.async_apply_scene(targets, call.data["timeout"]) for hub, targets in hubs])
+        return {
+            "duration":max([result["duration"] for result in results], default=0),
+            "confirmed":sum([result["confirmed"] for result in results]),
+            "failed":[name for result in results for name in result["failed"]],
+        }
+
+    hass.services.async_register(DOMAIN, SERVICE_PROFILE, async_profile, schema=PROFILE_SCHEMA)
+    hass.services.async_register(DOMAIN, SERVICE_REFRESH_STATE, async_refresh_state, schema=REFRESH_STATE_SCHEMA, supports_response=SupportsResponse.OPTIONAL)
+    hass.services.async_register(DOMAIN, SERVICE_APPLY_SCENE, async_apply_scene, schema=APPLY_SCENE_SCHEMA, supports_response=SupportsResponse.OPTIONAL)
+
+def async_unload_services(hass: HomeAssistant) -> None:
+    """Remove the integration services once the last config entry is unloaded."""
+    if not hass.data.get(DOMAIN):
+        hass.services.async_remove(DOMAIN, SERVICE_PROFILE)
+        hass.services.async_remove(DOMAIN, SERVICE_REFRESH_STATE)
+        hass.services.async_remove(DOMAIN, SERVICE_APPLY_SCENE)
@@ -27,49 +27,34 @@ class CyncPlugEntity(SwitchEntity):
     """Representation of a Cync Switch Light Entity."""
 
     should_poll = False
+    _attr_device_class = SwitchDeviceClass.OUTLET
 
     def __init__(self, cync_switch) -> None:
         """Initialize the light."""
         self.cync_switch = cync_switch
-
-    async def async_added_to_hass(self) -> None:
-        """Run when this Entity has been added to HA."""
-        self.cync_switch.register(self.schedule_update_ha_state)
-
-    async def async_will_remove_from_hass(self) -> None:
-        """Entity being removed from hass."""
-        self.cync_switch.reset()
-
-    @property
-    def device_info(self) -> DeviceInfo:
-        """Return device registry information for this entity."""
-        return DeviceInfo(
+        self._attr_device_info = DeviceInfo(
             identifiers = {(DOMAIN, f"{self.cync_switch.room.name} ({self.cync_switch.home_name})")},
             manufacturer = "Cync by Savant",
             name = f"{self.cync_switch.room.name} ({self.cync_switch.home_name})",
             suggested_area = f"{self.cync_switch.room.name}",
         )
+        self._attr_unique_id = 'cync_switch_' + self.cync_switch.device_id
+        self._attr_name = self.cync_switch.name
+        self._attr_is_on = self.cync_switch.power_state
 
-    @property
-    def unique_id(self) -> str:
-        """Return Unique ID string."""
-        return 'cync_switch_' + self.cync_switch.device_id 
+    async def async_added_to_hass(self) -> None:
+        """Run when this Entity has been added to HA."""
+        self.cync_switch.register(self._handle_update)
 
-    @property
-    def name(self) -> str:
-        """Return the name of the switch."""
-        return self.cync_switch.name
+    async def async_will_remove_from_hass(self) -> None:
+        """Entity being removed from hass."""
+        self.cync_switch.reset()
 
-    @property
-    def device_class(self) -> str | None:
-        """Return the device class"""
-        return SwitchDeviceClass.OUTLET
+    def _handle_update(self) -> None:
+        """Refresh the state attributes and write the state, called on the Home Assistant loop."""
+        self._attr_is_on = self.cync_switch.power_state
+        self.async_write_ha_state()
 
-    @property
-    def is_on(self) -> bool | None:
-        """Return true if light is on."""
-        return self.cync_switch.power_state
-            
     async def async_turn_on(self, **kwargs: Any) -> None:
         """Turn on the outlet."""
         await self.cync_switch.turn_on(None, None, None)
@@ -0,0 +1,166 @@
+"""Transports carrying a Cync hub session."""
+import asyncio
+import ssl
+import struct
+import time
+
+CYNC_SERVER_HOST = 'cm.gelighting.com'
+CYNC_SERVER_TLS_PORT = 23779
+CYNC_SERVER_PORT = 23778
+MAX_PACKET_LENGTH = 65535
+
+class CyncTransport:
+    """
+    Base class for the connection of one hub session.
+    Subclasses open the connection and move raw bytes, the base class splits what is read into frames
+    and keeps the byte and framing counters of the hub metrics.
+    """
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        #per connection, the hub metrics are shared by every session and cannot tell a half-open one apart
+        self.last_frame_at = None
+        self._partial = b''
+
+    async def open(self):
+        raise NotImplementedError
+
+    async def _read(self, size):
+        """Return up to size bytes, or b'' once the connection is closed"""
+        raise NotImplementedError
+
+    def _write(self, data):
+        raise NotImplementedError
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+    async def read(self, size=1000):
+        data = await self._read(size)
+        self.metrics.bytes_in += len(data)
+        if data:
+            self.last_frame_at = self.metrics.last_frame_at = time.monotonic()
+        return data
+
+    def write(self, data):
+        self._write(data)
+        self.metrics.bytes_out += len(data)
+
+    async def read_frames(self):
+        """Return the complete frames read so far as (packet_type, packet, packet_length), or None once the connection is closed"""
+        data = await self.read(1000)
+        if len(data) == 0:
+            return None
+        if self._partial:
+            data = self._partial + data
+        frames = []
+        while len(data) >= 5:
+            packet_type = int(data[0])
+            packet_length = struct.unpack(">I", data[1:5])[0]
+            if packet_length > MAX_PACKET_LENGTH:
+                #framing is lost, drop what has been read so far
+                self.metrics.decode_errors += 1
+                data = b''
+                break
+            if len(data) < packet_length + 5:
+                #the rest of this packet arrives with the next read
+                break
+            frames.append((packet_type, data[5:packet_length+5], packet_length))
+            data = data[packet_length+5:]
+        self._partial = data
+        return frames
+
+class StreamTransport(CyncTransport):
+    """Transport over an asyncio stream, subclasses choose how the stream is opened"""
+
+    def __init__(self, metrics):
+        super().__init__(metrics)
+        self.reader = None
+        self.writer = None
+
+    async def _read(self, size):
+        return await self.reader.read(size)
+
+    def _write(self, data):
+        self.writer.write(data)
+
+    async def drain(self):
+        await self.writer.drain()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+class HostTransport(StreamTransport):
+    """Transport to a server at a given host and port, such as a local stand-in for the Cync server"""
+
+    def __init__(self, metrics, host, port, ssl_context=None):
+        super().__init__(metrics)
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port, ssl = self.ssl_context)
+
+class CloudTransport(StreamTransport):
+    """Transport to the Cync cloud server, falling back to unverified TLS and then to plain TCP"""
+
+    async def open(self):
+        context = ssl.create_default_context()
+        try:
+            self.reader, self.writer = await asyncio.open_connection(CYNC_SERVER_HOST, CYNC_SERVER_TLS_PORT, ssl = context)
+        except Exception as e:
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+            try:
+                self.reader, self.writer = await asyncio.open_connection(CYNC_SERVER_HOST, CYNC_SERVER_TLS_PORT, ssl = context)
+            except Exception as e:
+                self.reader, self.writer = await asyncio.open_connection(CYNC_SERVER_HOST, CYNC_SERVER_PORT)
+
+class PipeTransport(CyncTransport):
+    """
+    In-memory transport for tests and benchmarks.
+    Everything the hub writes is passed to responder(transport, data), which answers by calling feed.
+    """
+
+    def __init__(self, metrics, responder=None):
+        super().__init__(metrics)
+        self.responder = responder
+        self.written = []
+        self._inbound = None
+        self._unread = b''
+        self._closed = False
+
+    async def open(self):
+        self._inbound = asyncio.Queue()
+
+    def feed(self, data):
+        """Deliver bytes to the hub as if they were read from the server"""
+        self._inbound.put_nowait(bytes(data))
+
+    def feed_eof(self):
+        self._inbound.put_nowait(b'')
+
+    async def _read(self, size):
+        if self._closed:
+            return b''
+        data = self._unread or await self._inbound.get()
+        #deliver the rest with the next read, as a socket would
+        self._unread = data[size:]
+        return data[:size]
+
+    def _write(self, data):
+        if self.responder is not None:
+            self.responder(self, data)
+        else:
+            self.written.append(data)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            if self._inbound is not None:
+                self.feed_eof()